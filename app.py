@@ -19,7 +19,9 @@ from routes.about import about_bp
 from routes.bonds import bonds_bp
 from routes.dividends import dividends_bp
 from routes.settings import settings_bp
-from db import close_db
+from routes.logos import logos_bp
+from db import close_db, init_db
+from market_refresher import REFRESHER
 
 app = Flask(__name__)
 
@@ -54,11 +56,22 @@ app.register_blueprint(about_bp, url_prefix='/about')
 app.register_blueprint(bonds_bp, url_prefix='/bonds')
 app.register_blueprint(dividends_bp, url_prefix='/dividends')
 app.register_blueprint(settings_bp)
+app.register_blueprint(logos_bp, url_prefix='/logos')
+
+# Create or upgrade the schema before serving requests
+init_db()
 
 # Close DB connections after each request
 app.teardown_appcontext(close_db)
 
 
+# Start the market data refresher in the process that serves requests
+# (not in the debug reloader's watcher process)
+@app.before_request
+def start_background_refresher():
+    REFRESHER.start(app)
+
+
 # Home (redirect to dashboard)
 @app.route('/')
 def home():
@@ -1,70 +1,313 @@
 import json
-import sqlite3
+import os
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
-from pathlib import Path
 
-DB_PATH = Path(__file__).resolve().parent / "portfolio.db"
+from db import DB_PATH, pooled_connection
+
+HOT_CACHE_ITEMS = 2048  # entries kept in the in-process LRU tier
+SQL_BATCH_SIZE = 500    # keys per "IN (...)" query, below SQLite's variable limit
+
+DEFAULT_TTL = 7 * 24 * 60 * 60  # expiry for entries written without an explicit ttl
+SWEEP_INTERVAL = 60             # seconds between on-write sweeps
+CACHE_MAX_ROWS = int(os.environ.get("CACHE_MAX_ROWS", 20000))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+def _namespace(key):
+    return key.split(":", 1)[0]
+
+
+def _format_ts(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else None
 
 
 class CacheStore:
-    def __init__(self, db_path=DB_PATH):
+    """SQLite-backed key/value cache with an in-process LRU tier in front.
+
+    Connections come from the shared per-thread pool in ``db``. The hot tier only holds
+    entries this process has read or written; it is cleared together with the
+    table, and entries still honour ``max_age_seconds`` on every read.
+
+    Rows also carry their expiry (fixed at write time), size and last access.
+    Writes trigger a periodic sweep that deletes expired rows in batches and
+    then evicts least-recently-used rows while the table exceeds ``max_rows``
+    or ``max_bytes``. Reads only note access times in memory; they are flushed
+    to SQLite by the next sweep.
+
+    Every write or clear also bumps a counter for the key's namespace (the
+    part before the first ``:``), so callers can tell whether anything in,
+    say, ``price:*`` changed without reading the entries themselves.
+    """
+
+    def __init__(
+        self,
+        db_path=DB_PATH,
+        hot_items=HOT_CACHE_ITEMS,
+        max_rows=CACHE_MAX_ROWS,
+        max_bytes=CACHE_MAX_BYTES,
+        default_ttl=DEFAULT_TTL,
+    ):
         self.db_path = str(db_path)
-        self._ensure_table()
+        self.hot_items = hot_items
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._hot = OrderedDict()
+        self._hot_lock = threading.Lock()
+        self._touched = {}
+        self._sweep_lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._swept = {"expired_deleted": 0, "evicted": 0}
 
-    def _ensure_table(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS api_cache (
-                    key TEXT PRIMARY KEY,
-                    value TEXT,
-                    timestamp REAL
-                )
-                """
-            )
+    def _connection(self):
+        return pooled_connection(self.db_path)
 
-    def get(self, key, max_age_seconds):
-        with sqlite3.connect(self.db_path) as conn:
-            cur = conn.execute("SELECT value, timestamp FROM api_cache WHERE key = ?", (key,))
-            row = cur.fetchone()
-        if not row:
-            return None
-        value, ts = row
+    def _hot_get(self, key):
+        with self._hot_lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                self._hot.move_to_end(key)
+            return entry
+
+    def _hot_put(self, key, raw, ts):
+        if self.hot_items <= 0:
+            return
+        with self._hot_lock:
+            self._hot[key] = (raw, ts)
+            self._hot.move_to_end(key)
+            while len(self._hot) > self.hot_items:
+                self._hot.popitem(last=False)
+
+    def _hot_clear(self, prefix=None):
+        with self._hot_lock:
+            if prefix is None:
+                self._hot.clear()
+                self._touched.clear()
+                return
+            for key in [key for key in self._hot if key.startswith(prefix)]:
+                del self._hot[key]
+
+    def _touch(self, keys, now):
+        with self._hot_lock:
+            for key in keys:
+                self._touched[key] = now
+
+    @staticmethod
+    def _decode(raw, ts, max_age_seconds):
         if time.time() - ts > max_age_seconds:
             return None
         try:
-            return json.loads(value)
+            return json.loads(raw)
         except Exception:
             return None
 
-    def set(self, key, value):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
+    def get(self, key, max_age_seconds):
+        entry = self._hot_get(key)
+        if entry is None or time.time() - entry[1] > max_age_seconds:
+            # Fall through to SQLite: another process may hold a fresher copy.
+            cur = self._connection().execute(
+                "SELECT value, timestamp FROM api_cache WHERE key = ?", (key,)
+            )
+            row = cur.fetchone()
+            if not row:
+                return None
+            entry = (row[0], row[1])
+            self._hot_put(key, *entry)
+        self._touch((key,), time.time())
+        return self._decode(entry[0], entry[1], max_age_seconds)
+
+    def get_many(self, keys, max_age_seconds):
+        """Return ``{key: value}`` for every fresh entry among ``keys``.
+
+        Keys served by the hot tier never reach SQLite; the rest are read with
+        one ``WHERE key IN (...)`` query per ``SQL_BATCH_SIZE`` keys.
+        """
+        now = time.time()
+        entries = {}
+        missing = []
+        for key in dict.fromkeys(keys):
+            entry = self._hot_get(key)
+            if entry is None or now - entry[1] > max_age_seconds:
+                missing.append(key)
+            else:
+                entries[key] = entry
+
+        conn = self._connection()
+        for start in range(0, len(missing), SQL_BATCH_SIZE):
+            chunk = missing[start:start + SQL_BATCH_SIZE]
+            placeholders = ",".join("?" for _ in chunk)
+            cur = conn.execute(
+                f"SELECT key, value, timestamp FROM api_cache WHERE key IN ({placeholders})",
+                chunk,
+            )
+            for key, raw, ts in cur.fetchall():
+                entries[key] = (raw, ts)
+                self._hot_put(key, raw, ts)
+
+        self._touch(entries, now)
+        results = {}
+        for key, (raw, ts) in entries.items():
+            value = self._decode(raw, ts, max_age_seconds)
+            if value is not None:
+                results[key] = value
+        return results
+
+    def set(self, key, value, ttl=None):
+        """Store ``value`` under ``key``; the row expires ``ttl`` seconds from now."""
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, mapping, ttl=None):
+        """Write every ``key: value`` pair of ``mapping`` in a single transaction."""
+        if not mapping:
+            return
+        ts = time.time()
+        expires_at = ts + (ttl if ttl is not None else self.default_ttl)
+        rows = []
+        for key, value in mapping.items():
+            raw = json.dumps(value)
+            rows.append((key, raw, ts, expires_at, ts, len(key) + len(raw)))
+        conn = self._connection()
+        with conn:
+            conn.executemany(
                 """
-                INSERT OR REPLACE INTO api_cache (key, value, timestamp)
-                VALUES (?, ?, ?)
+                INSERT OR REPLACE INTO api_cache (key, value, timestamp, expires_at, accessed_at, size)
+                VALUES (?, ?, ?, ?, ?, ?)
                 """,
-                (key, json.dumps(value), time.time()),
+                rows,
             )
+            self._bump(conn, {_namespace(key) for key in mapping})
+        for key, raw, *_ in rows:
+            self._hot_put(key, raw, ts)
+        if ts - self._last_sweep >= SWEEP_INTERVAL:
+            self.sweep()
+
+    @staticmethod
+    def _bump(conn, namespaces):
+        conn.executemany(
+            """
+            INSERT INTO cache_generations (namespace, generation) VALUES (?, 1)
+            ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1
+            """,
+            [(namespace,) for namespace in namespaces],
+        )
+
+    def generation(self, namespaces):
+        """Return a number that changes whenever any of ``namespaces`` is written or cleared."""
+        namespaces = list(namespaces)
+        placeholders = ",".join("?" for _ in namespaces)
+        row = self._connection().execute(
+            f"SELECT COALESCE(SUM(generation), 0) FROM cache_generations WHERE namespace IN ({placeholders})",
+            namespaces,
+        ).fetchone()
+        return row[0]
+
+    def _delete_keys(self, conn, keys):
+        for start in range(0, len(keys), SQL_BATCH_SIZE):
+            chunk = keys[start:start + SQL_BATCH_SIZE]
+            placeholders = ",".join("?" for _ in chunk)
+            with conn:
+                conn.execute(f"DELETE FROM api_cache WHERE key IN ({placeholders})", chunk)
+        with self._hot_lock:
+            for key in keys:
+                self._hot.pop(key, None)
+                self._touched.pop(key, None)
+        return len(keys)
+
+    def sweep(self):
+        """Delete expired rows, then evict LRU rows beyond the row/byte caps."""
+        if not self._sweep_lock.acquire(blocking=False):
+            return {"expired_deleted": 0, "evicted": 0}
+        try:
+            now = time.time()
+            self._last_sweep = now
+            conn = self._connection()
+
+            with self._hot_lock:
+                touched = [(ts, key, ts) for key, ts in self._touched.items()]
+                self._touched.clear()
+            with conn:
+                conn.executemany(
+                    "UPDATE api_cache SET accessed_at = ? WHERE key = ? AND accessed_at < ?",
+                    touched,
+                )
+
+            expired = 0
+            while True:
+                keys = [
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT key FROM api_cache WHERE expires_at <= ? LIMIT ?",
+                        (now, SQL_BATCH_SIZE),
+                    )
+                ]
+                expired += self._delete_keys(conn, keys)
+                if len(keys) < SQL_BATCH_SIZE:
+                    break
+
+            victims = []
+            total_rows, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM api_cache"
+            ).fetchone()
+            over_rows = total_rows - self.max_rows if self.max_rows else 0
+            over_bytes = total_bytes - self.max_bytes if self.max_bytes else 0
+            if over_rows > 0 or over_bytes > 0:
+                cur = conn.execute("SELECT key, size FROM api_cache ORDER BY accessed_at ASC")
+                for key, size in cur:
+                    if over_rows <= 0 and over_bytes <= 0:
+                        break
+                    victims.append(key)
+                    over_rows -= 1
+                    over_bytes -= size or 0
+                cur.close()
+            evicted = self._delete_keys(conn, victims)
+
+            self._swept["expired_deleted"] += expired
+            self._swept["evicted"] += evicted
+            return {"expired_deleted": expired, "evicted": evicted}
+        finally:
+            self._sweep_lock.release()
 
     def stats(self):
-        with sqlite3.connect(self.db_path) as conn:
-            cur = conn.execute("SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM api_cache")
-            total, oldest, newest = cur.fetchone()
+        cur = self._connection().execute(
+            """
+            SELECT COUNT(*), MIN(timestamp), MAX(timestamp), COALESCE(SUM(size), 0),
+                   COALESCE(SUM(expires_at <= ?), 0)
+            FROM api_cache
+            """,
+            (time.time(),),
+        )
+        total, oldest, newest, total_bytes, expired = cur.fetchone()
+        with self._hot_lock:
+            hot_items = len(self._hot)
         return {
             "total_items": total or 0,
-            "oldest": datetime.fromtimestamp(oldest).strftime("%Y-%m-%d %H:%M:%S") if oldest else None,
-            "newest": datetime.fromtimestamp(newest).strftime("%Y-%m-%d %H:%M:%S") if newest else None,
+            "total_bytes": total_bytes,
+            "expired_items": expired,
+            "hot_items": hot_items,
+            "max_rows": self.max_rows,
+            "max_bytes": self.max_bytes,
+            "expired_deleted": self._swept["expired_deleted"],
+            "evicted": self._swept["evicted"],
+            "last_sweep": _format_ts(self._last_sweep),
+            "oldest": _format_ts(oldest),
+            "newest": _format_ts(newest),
         }
 
     def clear_all(self):
-        with sqlite3.connect(self.db_path) as conn:
+        conn = self._connection()
+        with conn:
             conn.execute("DELETE FROM api_cache")
+            conn.execute("UPDATE cache_generations SET generation = generation + 1")
+        self._hot_clear()
 
     def clear_prefix(self, prefix):
-        with sqlite3.connect(self.db_path) as conn:
+        conn = self._connection()
+        with conn:
             conn.execute("DELETE FROM api_cache WHERE key LIKE ?", (f"{prefix}%",))
+            self._bump(conn, [_namespace(prefix)])
+        self._hot_clear(prefix)
 
 
 # Create the global cache instance
@@ -0,0 +1,301 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from bond_helpers import parse_bond_row, calculate_accrual, accrued_interest_series
+from cache_store import CACHE
+from db import get_data_versions
+from helpers import (
+    PRICE_TTL,
+    get_current_prices,
+    get_fx_rates_for_assets,
+    get_logo_urls,
+)
+from position_helpers import load_positions
+from snapshot_helpers import load_profit_series
+
+# Built dashboard sections keyed by (name, data_version()); serving a cached one
+# skips all position, price, bond and profit-series work.
+SECTION_CACHE_ITEMS = 32
+SECTION_TTL = PRICE_TTL  # quotes behind a cached section must not outlive their own cache entry
+MARKET_NAMESPACES = ("price", "fx", "logo")
+
+OVERVIEW_COLORS = {
+    "Equities/ETFs": "#38bdf8",
+    "Bonds": "#10b981",
+    "Cash": "#facc15",
+}
+EQUITY_COLORS = [
+    "#38bdf8", "#818cf8", "#f472b6", "#fb7185", "#f97316",
+    "#facc15", "#4ade80", "#34d399", "#22d3ee", "#a855f7", "#64748b"
+]
+BOND_COLORS = [
+    "#10b981", "#34d399", "#22d3ee", "#0ea5e9", "#14b8a6", "#2dd4bf", "#5eead4", "#99f6e4"
+]
+
+_SECTIONS = OrderedDict()
+_SECTIONS_LOCK = threading.Lock()
+
+
+def data_version(db):
+    """Everything the dashboard sections depend on, cheap to read on every hit."""
+    versions = get_data_versions(db)
+    return (
+        date.today().isoformat(),
+        versions.get("transactions", 0),
+        versions.get("bonds", 0),
+        versions.get("cash", 0),
+        CACHE.generation(MARKET_NAMESPACES),
+    )
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def peek_section(name, version):
+    """Return the cached section for ``version`` or None, without building it."""
+    with _SECTIONS_LOCK:
+        entry = _SECTIONS.get((name, version))
+        if entry is None or time.time() - entry[1] > SECTION_TTL:
+            return None
+        _SECTIONS.move_to_end((name, version))
+        return entry[0]
+
+
+def load_section(db, name):
+    """Return ``(section, version)``, building and caching the section on a miss."""
+    version = data_version(db)
+    section = peek_section(name, version)
+    if section is not None:
+        return section, version
+    section = SECTION_BUILDERS[name](db)
+    # Price fetches during the build may have moved the market generation
+    version = data_version(db)
+    with _SECTIONS_LOCK:
+        _SECTIONS[(name, version)] = (section, time.time())
+        _SECTIONS.move_to_end((name, version))
+        while len(_SECTIONS) > SECTION_CACHE_ITEMS:
+            _SECTIONS.popitem(last=False)
+    return section, version
+
+
+def _load_transactions(db):
+    cur = db.cursor()
+    cur.execute(
+        """
+        SELECT id, date, asset, category, type, quantity, price, currency
+        FROM transactions
+        ORDER BY date ASC, id ASC
+        """
+    )
+    return [
+        {
+            "id": row[0],
+            "date": row[1],
+            "asset": row[2],
+            "category": row[3],
+            "type": row[4],
+            "quantity": row[5],
+            "price": row[6],
+            "currency": row[7],
+        }
+        for row in cur.fetchall()
+    ]
+
+
+def _load_bond_positions(db):
+    cur = db.cursor()
+    cur.execute("SELECT * FROM bonds ORDER BY purchase_date DESC, id DESC")
+    return [parse_bond_row(row) for row in cur.fetchall()]
+
+
+def load_current_cash(db):
+    cur = db.cursor()
+    cur.execute("SELECT amount FROM cash_deposits ORDER BY created_at DESC LIMIT 1")
+    cash_row = cur.fetchone()
+    return round(cash_row[0] if cash_row else 0.0, 2)
+
+
+def build_holdings(db):
+    open_positions = load_positions(db, open_only=True)
+
+    asset_symbols = [asset for (asset, _, _), _ in open_positions.items()]
+    current_prices, current_currencies, current_fx_rates = get_current_prices(asset_symbols)
+
+    rows = []
+    adjusted_current_prices = {}
+    equity_total_value = 0.0
+    equity_profit_total = 0.0
+
+    for (asset, category, currency), data in sorted(
+        open_positions.items(), key=lambda item: item[0][0]
+    ):
+        net_qty = data["net_quantity"]
+        if net_qty <= 0:
+            continue
+
+        investment_cost_local = data["cost_basis"]
+        weighted_avg_price_local = investment_cost_local / net_qty if net_qty else 0.0
+        current_price_local = current_prices.get(asset, 0.0)
+        fx_rate = current_fx_rates.get(asset, 1.0)
+
+        weighted_avg_price_pln = weighted_avg_price_local * fx_rate
+        investment_cost_pln = investment_cost_local * fx_rate
+        current_price_pln = current_price_local * fx_rate
+        current_value_pln = current_price_pln * net_qty
+        profit_loss_pln = current_value_pln - investment_cost_pln
+        profit_loss_perc = (profit_loss_pln / investment_cost_pln * 100) if investment_cost_pln else 0.0
+        display_currency = currency or current_currencies.get(asset) or 'PLN'
+
+        rows.append(
+            {
+                "asset": asset,
+                "category": category,
+                "currency": display_currency,
+                "quantity": net_qty,
+                "weighted_avg_price_local": weighted_avg_price_local,
+                "weighted_avg_price_pln": weighted_avg_price_pln,
+                "investment_cost_pln": investment_cost_pln,
+                "current_price_local": current_price_local,
+                "current_price_pln": current_price_pln,
+                "current_value_pln": current_value_pln,
+                "profit_loss_pln": profit_loss_pln,
+                "profit_loss_perc": profit_loss_perc,
+            }
+        )
+
+        adjusted_current_prices[asset] = current_price_local
+        equity_total_value += current_value_pln
+        equity_profit_total += profit_loss_pln
+
+    logo_urls = get_logo_urls([row["asset"] for row in rows])
+    for row in rows:
+        row["logo_url"] = logo_urls.get(row["asset"], "")
+
+    return {
+        "rows": rows,
+        "equity_total_value": round(equity_total_value, 2),
+        "equity_profit_total": round(equity_profit_total, 2),
+        "current_prices": adjusted_current_prices,
+    }
+
+
+def build_bonds(db):
+    bond_positions = _load_bond_positions(db)
+    logo_urls = get_logo_urls([bond.series for bond in bond_positions])
+
+    bonds = []
+    total_value = 0.0
+    total_accrued = 0.0
+    for bond in bond_positions:
+        accrual = calculate_accrual(bond)
+        bonds.append(
+            {
+                "id": bond.id,
+                "series": bond.series,
+                "bond_type": bond.bond_type,
+                "purchase_date": bond.purchase_date.isoformat(),
+                "maturity_date": bond.maturity_date.isoformat(),
+                "principal": bond.principal,
+                "accrued_interest": accrual["accrued_interest"],
+                "current_value": accrual["current_value"],
+                "effective_rate": accrual["effective_rate"],
+                "logo_url": logo_urls.get(bond.series, ""),
+            }
+        )
+        total_value += accrual["current_value"]
+        total_accrued += accrual["accrued_interest"]
+
+    return {
+        "bonds": bonds,
+        "total_value": round(total_value, 2),
+        "total_accrued": round(total_accrued, 2),
+    }
+
+
+def build_profit(db):
+    holdings, _ = load_section(db, "holdings")
+    transactions = _load_transactions(db)
+    asset_currency_map = {}
+    for tx in transactions:
+        asset = tx.get("asset")
+        if not asset:
+            continue
+        asset_currency_map.setdefault(asset, tx.get("currency") or "PLN")
+
+    fx_rates_all = get_fx_rates_for_assets(asset_currency_map)
+    series = load_profit_series(db, transactions, fx_rates_all, holdings["current_prices"])
+
+    if series:
+        bond_accrual = accrued_interest_series(
+            _load_bond_positions(db), [point["date"] for point in series]
+        )
+        for point, accrued in zip(series, bond_accrual.tolist()):
+            point["value"] = round(point["value"] + accrued, 2)
+        total = series[-1]["value"]
+    else:
+        bonds, _ = load_section(db, "bonds")
+        total = round(holdings["equity_profit_total"] + bonds["total_accrued"], 2)
+
+    return {"series": series, "total": total}
+
+
+def _cycle_colors(base_colors, count):
+    if not base_colors:
+        return []
+    return [base_colors[i % len(base_colors)] for i in range(count)]
+
+
+def build_allocation(db):
+    holdings, _ = load_section(db, "holdings")
+    bonds, _ = load_section(db, "bonds")
+    current_cash = load_current_cash(db)
+
+    equity_detail_data = [
+        {"label": row["asset"], "value": round(row["current_value_pln"], 2)}
+        for row in holdings["rows"]
+    ]
+    bond_detail_data = [
+        {"label": bond["series"], "value": round(bond["current_value"], 2)}
+        for bond in bonds["bonds"]
+    ]
+
+    overview = [
+        {"label": "Equities/ETFs", "value": holdings["equity_total_value"], "color": OVERVIEW_COLORS["Equities/ETFs"]},
+        {"label": "Bonds", "value": bonds["total_value"], "color": OVERVIEW_COLORS["Bonds"]},
+        {"label": "Cash", "value": current_cash, "color": OVERVIEW_COLORS["Cash"]},
+    ]
+
+    detail = {
+        "Equities/ETFs": {
+            "data": equity_detail_data,
+            "colors": _cycle_colors(EQUITY_COLORS, len(equity_detail_data)),
+        },
+        "Bonds": {
+            "data": bond_detail_data,
+            "colors": _cycle_colors(BOND_COLORS, len(bond_detail_data)),
+        },
+        "Cash": {
+            "data": [{"label": "Cash", "value": current_cash}],
+            "colors": [OVERVIEW_COLORS["Cash"]],
+        },
+    }
+
+    total_value = holdings["equity_total_value"] + bonds["total_value"] + current_cash
+    return {
+        "overview": overview,
+        "detail": detail,
+        "current_cash": current_cash,
+        "total_value_pln": round(total_value, 2),
+    }
+
+
+SECTION_BUILDERS = {
+    "holdings": build_holdings,
+    "bonds": build_bonds,
+    "profit": build_profit,
+    "allocation": build_allocation,
+}
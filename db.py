@@ -1,14 +1,111 @@
+import os
 import sqlite3
+import threading
+import weakref
 from pathlib import Path
 
 from flask import g
 
 DB_PATH = Path(__file__).resolve().parent / "portfolio.db"
+MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+CACHE_SIZE_KIB = int(os.environ.get("SQLITE_CACHE_KIB", 32 * 1024))
+POOL_IDLE_CONNECTIONS = 8  # connections kept per database for the next thread
+
+# Applied to every connection get_db() opens. WAL lets readers run alongside
+# a writer, and with it synchronous=NORMAL is still safe against corruption.
+DB_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA mmap_size={MMAP_SIZE}",
+    f"PRAGMA cache_size=-{CACHE_SIZE_KIB}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+def connect(path=DB_PATH, check_same_thread=True):
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=check_same_thread)
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class _Lease:
+    __slots__ = ("conn", "__weakref__")
+
+
+class ConnectionPool:
+    """Long-lived connections to one database file, one per thread.
+
+    The first connection brings the schema up to date with ``migrate``, so
+    stores can rely on their tables existing. Every store on the same file
+    shares the calling thread's connection.
+    When a thread exits its connection goes back on an idle list for the
+    next thread instead of being closed, so short-lived worker pools reuse
+    connections rather than opening and configuring new ones. Connections
+    inherited across a fork are never reused.
+    """
+
+    def __init__(self, path=DB_PATH, max_idle=POOL_IDLE_CONNECTIONS):
+        self.path = str(path)
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._migrated = False
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self._local = threading.local()
+
+    def connection(self):
+        lease = getattr(self._local, "lease", None)
+        if lease is not None and self._pid == os.getpid():
+            return lease.conn
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = connect(self.path, check_same_thread=False)
+            if not self._migrated:
+                migrate(conn)
+                self._migrated = True
+        lease = _Lease()
+        lease.conn = conn
+        # Runs when the thread's locals are torn down, i.e. when it exits
+        weakref.finalize(lease, self._release, conn, self._pid).atexit = False
+        self._local.lease = lease
+        return conn
+
+    def _release(self, conn, pid):
+        if pid != os.getpid():
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if pid == self._pid and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def pooled_connection(path=DB_PATH):
+    """Return the calling thread's long-lived connection to ``path``; see ``ConnectionPool``."""
+    pool = _POOLS.get(str(path))
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.setdefault(str(path), ConnectionPool(path))
+    return pool.connection()
 
 
 def get_db():
     if "db" not in g:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect()
         conn.row_factory = sqlite3.Row
         g.db = conn
     return g.db
@@ -20,9 +117,23 @@ def close_db(e=None):
         db.close()
 
 
-def init_db():
-    db = sqlite3.connect(DB_PATH)
-    cur = db.cursor()
+def bump_data_version(db, name):
+    """Mark the ``name`` data set as changed; call before committing the write."""
+    db.execute(
+        """
+        INSERT INTO data_versions (name, version) VALUES (?, 1)
+        ON CONFLICT(name) DO UPDATE SET version = version + 1
+        """,
+        (name,),
+    )
+
+
+def get_data_versions(db):
+    return {row[0]: row[1] for row in db.execute("SELECT name, version FROM data_versions")}
+
+
+def _base_schema(cur):
+    """Schema as it stood before versioned migrations; safe on databases that already have it."""
     # Transactions table
     cur.execute('''
     CREATE TABLE IF NOT EXISTS transactions (
@@ -102,6 +213,51 @@ def init_db():
     )
     ''')
 
+    # Daily portfolio snapshots (equity P/L per day, filled incrementally)
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT,
+        total_value_pln REAL,
+        realized_pln REAL,
+        unrealized_pln REAL
+    )
+    ''')
+
+    # Materialised positions per (asset, category, currency), kept in step with
+    # transactions; last_date/last_id mark the last trade folded into each row
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS positions (
+        asset TEXT NOT NULL,
+        category TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        net_quantity REAL NOT NULL DEFAULT 0,
+        cost_basis REAL NOT NULL DEFAULT 0,
+        realized_pl REAL NOT NULL DEFAULT 0,
+        last_date TEXT,
+        last_id INTEGER,
+        PRIMARY KEY (asset, category, currency)
+    )
+    ''')
+
+    # Write counters per data set (transactions, bonds, cash, symbol_mappings) for cache invalidation
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    ''')
+
+    # Ensure snapshot P/L columns exist (the legacy table only stored total value)
+    cur.execute("PRAGMA table_info(snapshots)")
+    snapshot_columns = {row[1] for row in cur.fetchall()}
+    if "realized_pln" not in snapshot_columns:
+        cur.execute("ALTER TABLE snapshots ADD COLUMN realized_pln REAL")
+    if "unrealized_pln" not in snapshot_columns:
+        cur.execute("ALTER TABLE snapshots ADD COLUMN unrealized_pln REAL")
+    # Value-only legacy rows cannot seed the profit series; they are recomputed
+    cur.execute("DELETE FROM snapshots WHERE realized_pln IS NULL")
+
     # Ensure dividends.status column exists
     cur.execute("PRAGMA table_info(dividends)")
     dividend_columns = {row[1] for row in cur.fetchall()}
@@ -114,6 +270,207 @@ def init_db():
     ON symbol_mappings (internal_symbol, provider, active, priority)
     ''')
 
-    # Add any other tables (snapshots, etc.) here
-    db.commit()
-    db.close()
+    cur.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_snapshots_date
+    ON snapshots (date)
+    ''')
+
+
+def _query_indexes(cur):
+    # Keyset pagination of the transaction list and per-asset ledger reads
+    cur.execute('''
+    CREATE INDEX IF NOT EXISTS idx_transactions_date_id
+    ON transactions (date, id)
+    ''')
+
+    cur.execute('''
+    CREATE INDEX IF NOT EXISTS idx_transactions_asset_date
+    ON transactions (asset, date)
+    ''')
+
+    # Latest cash balance on the dashboard and the cash history
+    cur.execute('''
+    CREATE INDEX IF NOT EXISTS idx_cash_deposits_created
+    ON cash_deposits (created_at, id)
+    ''')
+
+    cur.execute('''
+    CREATE INDEX IF NOT EXISTS idx_bonds_purchase
+    ON bonds (purchase_date, id)
+    ''')
+
+
+def _trim_transaction_assets(cur):
+    # Writes strip tickers, so lookups can match asset exactly and use its
+    # indexes; bring older rows entered with stray whitespace in line
+    cur.execute("UPDATE transactions SET asset = TRIM(asset) WHERE asset != TRIM(asset)")
+
+
+
+def _cache_tables(cur):
+    # CacheStore; rows carry expiry, size and last access for the sweep
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS api_cache (
+        key TEXT PRIMARY KEY,
+        value TEXT,
+        timestamp REAL,
+        expires_at REAL,
+        accessed_at REAL,
+        size INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+    # Ensure expiry/eviction columns exist on caches created before them; old
+    # rows get the store's default week-long expiry from their write time
+    cur.execute("PRAGMA table_info(api_cache)")
+    cache_columns = {row[1] for row in cur.fetchall()}
+    if "expires_at" not in cache_columns:
+        cur.execute("ALTER TABLE api_cache ADD COLUMN expires_at REAL")
+    if "accessed_at" not in cache_columns:
+        cur.execute("ALTER TABLE api_cache ADD COLUMN accessed_at REAL")
+    if "size" not in cache_columns:
+        cur.execute("ALTER TABLE api_cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+    cur.execute('''
+    UPDATE api_cache
+    SET expires_at = COALESCE(timestamp, 0) + 604800,
+        accessed_at = COALESCE(accessed_at, timestamp, 0),
+        size = LENGTH(key) + COALESCE(LENGTH(value), 0)
+    WHERE expires_at IS NULL
+    ''')
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_api_cache_expires ON api_cache (expires_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_api_cache_accessed ON api_cache (accessed_at)")
+
+    # Per-namespace write counters; not subject to expiry or eviction
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS cache_generations (
+        namespace TEXT PRIMARY KEY,
+        generation INTEGER NOT NULL
+    )
+    ''')
+
+
+def _price_history_tables(cur):
+    # PriceHistoryStore: one close per (symbol, day) plus per-symbol sync state
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS price_history (
+        symbol TEXT NOT NULL,
+        day TEXT NOT NULL,
+        close REAL NOT NULL,
+        PRIMARY KEY (symbol, day)
+    ) WITHOUT ROWID
+    ''')
+
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS price_history_sync (
+        symbol TEXT PRIMARY KEY,
+        covered_from TEXT NOT NULL,
+        last_day TEXT,
+        fetched_at REAL NOT NULL
+    )
+    ''')
+
+
+def _provider_tables(cur):
+    # TokenBucket state per provider and SingleFlight's cross-process leases
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS provider_quota (
+        provider TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        day TEXT NOT NULL,
+        used_today INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS fetch_leases (
+        key TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    )
+    ''')
+
+
+def _symbol_index_tables(cur):
+    # SymbolIndex: instruments, their name/ticker trigrams and remote query log
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS instruments (
+        ticker TEXT PRIMARY KEY,
+        ticker_key TEXT NOT NULL,
+        name TEXT NOT NULL,
+        name_key TEXT NOT NULL,
+        exchange TEXT,
+        type TEXT,
+        source TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''')
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_instruments_ticker_key ON instruments (ticker_key)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_instruments_name_key ON instruments (name_key)")
+
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS instrument_trigrams (
+        gram TEXT NOT NULL,
+        ticker TEXT NOT NULL,
+        PRIMARY KEY (gram, ticker)
+    ) WITHOUT ROWID
+    ''')
+
+    cur.execute('''
+    CREATE TABLE IF NOT EXISTS symbol_search_queries (
+        query TEXT PRIMARY KEY,
+        fetched_at REAL NOT NULL,
+        results INTEGER NOT NULL
+    )
+    ''')
+
+# Applied in order; a database at PRAGMA user_version N has run the first N.
+# Append new migrations, never edit or reorder released ones.
+MIGRATIONS = (
+    _base_schema,
+    _query_indexes,
+    _trim_transaction_assets,
+    _cache_tables,
+    _price_history_tables,
+    _provider_tables,
+    _symbol_index_tables,
+)
+
+
+def migrate(conn):
+    """Bring ``conn``'s database up to ``len(MIGRATIONS)``; return the versions applied.
+
+    Each migration and its ``user_version`` bump commit together, and the
+    version is re-read under the write lock, so concurrent workers starting
+    at once apply every migration exactly once.
+    """
+    applied = []
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version >= len(MIGRATIONS):
+                    conn.execute("COMMIT")
+                    return applied
+                MIGRATIONS[version](conn.cursor())
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            applied.append(version + 1)
+    finally:
+        conn.isolation_level = isolation_level
+
+
+def init_db():
+    db = connect()
+    try:
+        migrate(db)
+    finally:
+        db.close()
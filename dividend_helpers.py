@@ -0,0 +1,130 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime
+
+from db import get_data_versions
+
+
+def parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            return None
+
+
+class HoldingsIndex:
+    """Shares held per asset over time: sorted trade dates with a running quantity.
+
+    ``shares_on(asset, day)`` is a binary search instead of a replay of the
+    asset's trades, so reconciling D dividends costs O(D log T).
+    """
+
+    def __init__(self, transactions):
+        """``transactions``: rows with asset, date, type and quantity, sorted by date then id."""
+        dates = defaultdict(list)
+        running = defaultdict(list)
+        for tx in transactions:
+            tx_date = parse_date(tx['date'])
+            if not tx_date:
+                continue
+            try:
+                qty = float(tx['quantity'])
+            except (TypeError, ValueError):
+                qty = 0.0
+            tx_type = (tx['type'] or '').lower()
+            asset = tx['asset']
+            net = running[asset][-1] if running[asset] else 0.0
+            if tx_type == 'buy':
+                net += qty
+            elif tx_type == 'sell':
+                net -= qty
+            dates[asset].append(tx_date)
+            running[asset].append(net)
+        self._dates = dict(dates)
+        self._running = dict(running)
+
+    def shares_on(self, asset, target_date, inclusive=True):
+        """Shares held on ``target_date``; trades on that day count only if ``inclusive``."""
+        if target_date is None:
+            return None
+        dates = self._dates.get(asset, [])
+        position = (bisect_right if inclusive else bisect_left)(dates, target_date)
+        net = self._running[asset][position - 1] if position else 0.0
+        if net < 0:
+            net = 0.0
+        return round(net, 6)
+
+
+def ensure_dividend_shares(db):
+    """Reconcile every dividend once if no full pass has run yet, e.g. on a
+    database from before shares were kept in step with writes.
+
+    Does not commit. Returns the number of rows updated, or None if a full
+    pass had already run.
+    """
+    if get_data_versions(db).get("dividend_shares") is None:
+        return reconcile_dividend_shares(db)
+    return None
+
+
+def reconcile_dividend_shares(db, assets=None):
+    """Set ``dividends.shares`` from holdings at each ex-date (pay date if no ex-date).
+
+    Limited to ``assets`` when given, unless no full pass has run yet. Does
+    not commit. Returns the number of rows updated.
+    """
+    where = ""
+    params = []
+    if assets is None:
+        # Marks the one-off catch-up in ensure_dividend_shares as done
+        db.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('dividend_shares', 1)")
+    else:
+        updated = ensure_dividend_shares(db)
+        if updated is not None:
+            return updated
+        assets = sorted({asset for asset in assets if asset})
+        if not assets:
+            return 0
+        where = f"WHERE asset IN ({','.join('?' for _ in assets)})"
+        params = assets
+
+    dividends = db.execute(
+        f"SELECT id, asset, ex_date, pay_date, shares, status FROM dividends {where}", params
+    ).fetchall()
+    if not dividends:
+        return 0
+    index = HoldingsIndex(
+        db.execute(
+            f"SELECT asset, date, type, quantity FROM transactions {where} ORDER BY date ASC, id ASC",
+            params,
+        ).fetchall()
+    )
+
+    updates = []
+    for row in dividends:
+        if not row['asset']:
+            continue
+        if (row['status'] or 'synced') not in ('synced', 'manual'):
+            continue
+        ex_date_obj = parse_date(row['ex_date'])
+        snapshot_date = ex_date_obj or parse_date(row['pay_date'])
+        if not snapshot_date:
+            continue
+        shares = index.shares_on(row['asset'], snapshot_date, inclusive=ex_date_obj is None)
+        existing = row['shares'] or 0.0
+        if shares <= 1e-9 and existing > 0:
+            # keep manually entered value if the auto calculation returns zero
+            continue
+        if abs(existing - shares) > 1e-6:
+            updates.append((shares, row['id']))
+
+    if updates:
+        db.executemany('UPDATE dividends SET shares=? WHERE id=?', updates)
+    return len(updates)
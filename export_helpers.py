@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from datetime import date
+
+from flask import Response
+
+from db import connect
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+FETCH_SIZE = 500  # rows read from the cursor and written to the client per chunk
+
+# Column order matches the "finly" import format, so a transactions export
+# can be imported back unchanged.
+TRANSACTION_COLUMNS = ("date", "asset", "type", "quantity", "price", "currency", "category", "id")
+DIVIDEND_COLUMNS = (
+    "id", "asset", "ex_date", "pay_date", "amount", "currency", "shares",
+    "gross_value", "net_value", "source", "notes", "status",
+)
+CASH_COLUMNS = ("id", "created_at", "amount", "delta", "note")
+PROFIT_COLUMNS = ("date", "value")
+
+
+def query_rows(sql, params=()):
+    """Yield lists of at most ``FETCH_SIZE`` rows for ``sql``.
+
+    Runs on its own read-only connection rather than the request's, because
+    the response body is produced after the request has been torn down. The
+    cursor is stepped lazily, so only one chunk is held in memory, and the
+    connection is closed when the export finishes or the client disconnects.
+    """
+    conn = connect()
+    try:
+        conn.execute("PRAGMA query_only=ON")
+        cur = conn.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def chunked(items, size=FETCH_SIZE):
+    """Split an in-memory sequence into the same chunks ``query_rows`` yields."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def csv_chunks(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # header only, for an empty export
+
+
+def jsonl_chunks(columns, chunks):
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), ensure_ascii=False, separators=(",", ":")) + "\n"
+            for row in rows
+        )
+
+
+def export_response(name, fmt, columns, chunks):
+    """Stream ``chunks`` of row tuples as a CSV or JSON-lines download."""
+    encode = jsonl_chunks if fmt == "jsonl" else csv_chunks
+    filename = f"finly-{name}-{date.today().isoformat()}.{fmt}"
+    return Response(
+        encode(columns, chunks),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+            # Stop reverse proxies from buffering the whole body before sending it on
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+def parse_export_format(args):
+    """Return the requested ``format`` query argument, or None if unsupported."""
+    fmt = (args.get("format") or "csv").strip().lower()
+    return fmt if fmt in EXPORT_FORMATS else None
@@ -1,9 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, date as date_cls
 import math
+import time
+import numpy as np
 import yfinance as yf
 
 from cache_store import CACHE
-from services.twelvedata import fetch_logo
+from logo_store import download_image, logo_path, logo_url, placeholder_image
+from price_store import PRICE_HISTORY
+from singleflight import FLIGHTS
+from services.ratelimit import RateLimited
+from services.twelvedata import INTERACTIVE_WAIT, fetch_logo
 from symbol_utils import build_twelvedata_candidates
 
 
@@ -37,31 +44,24 @@ PENCE_TICKERS = {
 PRICE_TTL = 10 * 60      # 10 minutes
 EVENT_TTL = 24 * 60 * 60 # 24 hours
 FX_TTL = 60 * 60         # 1 hour
-HISTORY_TTL = 12 * 60 * 60  # 12 hours
+HISTORY_TTL = 12 * 60 * 60  # 12 hours between price history tail refreshes
 LOGO_TTL = 7 * 24 * 60 * 60  # 7 days
-AVATAR_BACKGROUND = "0D8ABC"
-AVATAR_COLOR = "fff"
+LOGO_RETRY_SECONDS = 60 * 60  # placeholder standing in for a failed logo download
+QUOTE_WORKERS = 8            # concurrent Yahoo quote lookups
 
 
-def _get_price_history(symbol, start_date, end_date):
-    cache_key = f"history:{symbol}:{start_date}:{end_date}"
-    cached = CACHE.get(cache_key, HISTORY_TTL)
-    if cached:
-        series = []
-        for day_str, price in cached:
-            try:
-                day = datetime.fromisoformat(day_str).date()
-                series.append((day, float(price)))
-            except Exception:
-                continue
-        if series:
-            return series
+def _download_history(symbol, start_date, end_date):
+    """Return daily ``(day, close)`` tuples from Yahoo, or None if the call failed.
+
+    yfinance reports network and lookup errors as an empty frame instead of
+    raising, so a download without a single close counts as failed too.
+    """
     try:
         hist = yf.Ticker(symbol).history(
             start=start_date.isoformat(), end=(end_date + timedelta(days=1)).isoformat()
         )
     except Exception:
-        hist = None
+        return None
     series = []
     if hist is not None and not hist.empty:
         close_series = hist.get("Close")
@@ -78,22 +78,71 @@ def _get_price_history(symbol, start_date, end_date):
                     day = index.date()
                 series.append((day, price))
     series.sort()
-    if series:
-        CACHE.set(cache_key, [(day.isoformat(), price) for day, price in series])
-    return series
-
-
-def _get_fx_rate_to_pln(currency):
-    currency = _normalize_currency(currency)
-    if currency == "PLN":
-        return 1.0
-    cache_key = f"fx:{currency}"
-    cached = CACHE.get(cache_key, FX_TTL)
-    if cached:
-        try:
-            return float(cached)
-        except Exception:
-            pass
+    return series or None
+
+
+def _has_weekday(start_date, end_date):
+    return any(
+        (start_date + timedelta(days=offset)).weekday() < 5
+        for offset in range(min((end_date - start_date).days + 1, 7))
+    )
+
+
+def _sync_price_history(symbol, start_date, end_date):
+    """Download what the store is missing for the range; return ``start_date``."""
+    state = PRICE_HISTORY.sync_state(symbol)
+    if state is None:
+        series = _download_history(symbol, start_date, end_date)
+        if series is not None:
+            PRICE_HISTORY.append(symbol, series, start_date)
+    else:
+        covered_from, last_day, fetched_at = state
+        head_end = covered_from - timedelta(days=1)
+        miss_key = f"history_head_miss:{symbol}:{start_date.isoformat()}"
+        if start_date < covered_from and not _has_weekday(start_date, head_end):
+            # Only a weekend before the stored range: nothing to download
+            PRICE_HISTORY.append(symbol, [], start_date, fetched=False)
+        elif start_date < covered_from and CACHE.get(miss_key, HISTORY_TTL) is None:
+            head = _download_history(symbol, start_date, head_end)
+            if head is not None:
+                PRICE_HISTORY.append(symbol, head, start_date, fetched=False)
+            else:
+                # Failed, or the symbol did not trade yet; retry after HISTORY_TTL
+                # rather than on every load, without marking the range covered
+                CACHE.set(miss_key, True)
+        fetched_on = datetime.fromtimestamp(fetched_at).date()
+        if fetched_on < end_date or time.time() - fetched_at > HISTORY_TTL:
+            # Re-fetch the last stored day too: it may have been an intraday close.
+            tail = _download_history(symbol, last_day or covered_from, end_date)
+            if tail is not None:
+                PRICE_HISTORY.append(symbol, tail, covered_from)
+    return start_date
+
+
+def _get_price_history(symbol, start_date, end_date, read_from=None):
+    """Return daily closes for the range, downloading only what is not stored yet.
+
+    A symbol seen for the first time is fetched in full. Afterwards only the
+    head before the earliest requested day and, on a new day or once
+    ``HISTORY_TTL`` has passed, the tail from the last stored day onwards.
+    The sync state only advances when a download returned closes, so a
+    failed fetch is retried instead of leaving a permanent gap.
+    Concurrent callers share one sync per symbol. The closes come back as
+    ``(day ordinals, closes)`` arrays, see ``PriceHistoryStore.read_arrays``.
+    With ``read_from`` only closes from that day on are returned, preceded by
+    the last close before it so callers can carry it forward.
+    """
+    key = f"history:{symbol}"
+    synced_from = FLIGHTS.do(key, lambda: _sync_price_history(symbol, start_date, end_date))
+    if synced_from > start_date:
+        # Joined a sync for a shorter range; fetch the missing head ourselves
+        FLIGHTS.do(key, lambda: _sync_price_history(symbol, start_date, end_date))
+    if read_from and read_from > start_date:
+        return PRICE_HISTORY.read_arrays(symbol, read_from, end_date, carry_in=True)
+    return PRICE_HISTORY.read_arrays(symbol, start_date, end_date)
+
+
+def _fetch_fx_rate(currency):
     symbol = f"{currency}PLN=X"
     rate = None
     try:
@@ -113,209 +162,353 @@ def _get_fx_rate_to_pln(currency):
         rate = None
     if not rate:
         rate = 1.0
-    rate = float(rate)
-    CACHE.set(cache_key, rate)
-    return rate
+    return float(rate)
+
+
+def _load_fx_rate(currency, max_age):
+    """Fetch and cache one ``fx:{currency}`` entry, once across concurrent callers."""
+    key = f"fx:{currency}"
+
+    def fetch():
+        rate = _fetch_fx_rate(currency)
+        CACHE.set(key, rate, ttl=FX_TTL)
+        return rate
 
+    return FLIGHTS.do(key, fetch, lambda: CACHE.get(key, max_age))
 
-def get_fx_rates_for_assets(asset_currency_map):
+
+def _run_concurrently(func, items):
+    """Map ``func`` over ``items`` on a bounded thread pool, keyed by item."""
+    items = list(items)
+    if not items:
+        return {}
+    workers = max(1, min(QUOTE_WORKERS, len(items)))
+    if workers == 1:
+        return {item: func(item) for item in items}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(items, pool.map(func, items)))
+
+
+def _get_fx_rates_to_pln(currencies, max_age=FX_TTL):
+    """Return ``{currency: rate}`` using one bulk cache read; misses go through ``FLIGHTS``."""
     rates = {}
-    cache = {}
-    for asset, currency in asset_currency_map.items():
+    pending = []
+    for currency in currencies:
         norm = _normalize_currency(currency)
-        if norm in cache:
-            rate = cache[norm]
+        if norm in rates or norm in pending:
+            continue
+        if norm == "PLN":
+            rates[norm] = 1.0
         else:
-            rate = _get_fx_rate_to_pln(norm)
-            cache[norm] = rate
-        rates[asset] = rate
+            pending.append(norm)
+
+    cached = CACHE.get_many([f"fx:{currency}" for currency in pending], max_age)
+    misses = []
+    for currency in pending:
+        value = cached.get(f"fx:{currency}")
+        if value:
+            try:
+                rates[currency] = float(value)
+                continue
+            except Exception:
+                pass
+        misses.append(currency)
+
+    rates.update(_run_concurrently(lambda currency: _load_fx_rate(currency, max_age), misses))
     return rates
 
 
-def summarize_positions(transactions):
-    positions = {}
-    for tx in transactions:
-        asset = (tx.get("asset") or "").strip()
-        if not asset:
-            continue
-        category = tx.get("category") or "Unknown"
-        currency = _normalize_currency(tx.get("currency"))
-        quantity = _safe_float(tx.get("quantity"))
-        price = _safe_float(tx.get("price"))
-        tx_type = (tx.get("type") or "").lower()
+def get_fx_rates_for_assets(asset_currency_map, max_age=FX_TTL):
+    rates_by_currency = _get_fx_rates_to_pln(asset_currency_map.values(), max_age)
+    return {
+        asset: rates_by_currency[_normalize_currency(currency)]
+        for asset, currency in asset_currency_map.items()
+    }
 
-        key = (asset, category, currency)
-        position = positions.setdefault(
-            key,
-            {
-                "net_quantity": 0.0,
-                "cost_basis": 0.0,
-                "realized_pl": 0.0,
-            },
-        )
 
-        if tx_type == "buy":
-            position["net_quantity"] += quantity
-            position["cost_basis"] += quantity * price
-        elif tx_type == "sell":
-            available_qty = position["net_quantity"]
-            if available_qty <= 0:
-                continue
-            avg_cost = position["cost_basis"] / available_qty if available_qty else 0.0
-            sell_qty = min(quantity, available_qty)
-            position["net_quantity"] -= sell_qty
-            position["cost_basis"] -= sell_qty * avg_cost
-            position["realized_pl"] += sell_qty * (price - avg_cost)
-        else:
-            continue
+def position_key(tx):
+    """Return the ``(asset, category, currency)`` key a transaction belongs to, or None."""
+    asset = (tx.get("asset") or "").strip()
+    if not asset:
+        return None
+    return asset, tx.get("category") or "Unknown", _normalize_currency(tx.get("currency"))
+
+
+def new_position():
+    return {
+        "net_quantity": 0.0,
+        "cost_basis": 0.0,
+        "realized_pl": 0.0,
+    }
+
+
+def apply_to_position(position, tx):
+    """Apply one buy/sell to ``position`` in place (average-cost basis)."""
+    quantity = _safe_float(tx.get("quantity"))
+    price = _safe_float(tx.get("price"))
+    tx_type = (tx.get("type") or "").lower()
+
+    if tx_type == "buy":
+        position["net_quantity"] += quantity
+        position["cost_basis"] += quantity * price
+    elif tx_type == "sell":
+        available_qty = position["net_quantity"]
+        if available_qty <= 0:
+            return
+        avg_cost = position["cost_basis"] / available_qty if available_qty else 0.0
+        sell_qty = min(quantity, available_qty)
+        position["net_quantity"] -= sell_qty
+        position["cost_basis"] -= sell_qty * avg_cost
+        position["realized_pl"] += sell_qty * (price - avg_cost)
+    else:
+        return
+
+    if abs(position["net_quantity"]) < 1e-9:
+        position["net_quantity"] = 0.0
+    if abs(position["cost_basis"]) < 1e-9:
+        position["cost_basis"] = 0.0
 
-        if abs(position["net_quantity"]) < 1e-9:
-            position["net_quantity"] = 0.0
-        if abs(position["cost_basis"]) < 1e-9:
-            position["cost_basis"] = 0.0
 
+def summarize_positions(transactions):
+    positions = {}
+    for tx in transactions:
+        key = position_key(tx)
+        if key is None:
+            continue
+        apply_to_position(positions.setdefault(key, new_position()), tx)
     return positions
 
 
-def get_current_prices(symbols):
+def _fetch_quote(symbol):
+    """Return ``(price, currency, raw_currency)`` for a symbol straight from Yahoo."""
+    price = None
+    currency = None
+    raw_currency = None
+    try:
+        ticker = yf.Ticker(symbol)
+        info = getattr(ticker, "fast_info", None)
+        if info:
+            price = (
+                info.get("lastPrice")
+                or info.get("regularMarketPrice")
+                or info.get("previousClose")
+            )
+            currency = info.get("currency") or info.get("lastCurrency")
+            raw_currency = currency
+        if price is None:
+            hist = ticker.history(period="1d")
+            if not hist.empty:
+                price = hist['Close'][-1]
+        if currency is None:
+            currency = getattr(ticker, "info", {}).get("currency")
+        if raw_currency is None:
+            raw_currency = currency
+    except Exception:
+        return None, None, None
+    return price, currency, raw_currency
+
+
+def _read_cached_quote(cached):
+    """Return ``(price, currency)`` from a ``price:{symbol}`` entry, or None on a miss."""
+    if not isinstance(cached, dict):
+        # Missing, or legacy cache format (list/tuple) – force refresh to avoid re-scaling issues
+        return None
+    price = cached.get("price")
+    currency = cached.get("currency")
+    if price is None or currency is None:
+        return None
+    try:
+        return float(price), currency
+    except (TypeError, ValueError):
+        return None
+
+
+def _normalize_quote(symbol, price, currency, raw_currency):
+    price = _safe_float(price)
+    normalized_currency = _normalize_currency(currency)
+    if raw_currency:
+        if raw_currency in ("GBX", "GBp") and price:
+            price = float(price) / 100.0
+            normalized_currency = "GBP"
+        elif raw_currency == "GBP" and price and symbol in PENCE_TICKERS:
+            price = float(price) / 100.0
+        elif raw_currency == "GBP" and price:
+            price = float(price)
+    return float(price), normalized_currency
+
+
+def _load_quote(symbol, max_age):
+    """Fetch and cache one ``price:{symbol}`` entry, once across concurrent callers."""
+    key = f"price:{symbol}"
+
+    def fetch():
+        price, currency, raw_currency = _fetch_quote(symbol)
+        price, currency = _normalize_quote(symbol, price, currency, raw_currency)
+        entry = {
+            "price": price,
+            "currency": currency,
+            "raw_currency": raw_currency,
+            "cache_version": 2,
+        }
+        CACHE.set(key, entry, ttl=PRICE_TTL)
+        return entry
+
+    def recheck():
+        cached = CACHE.get(key, max_age)
+        return cached if _read_cached_quote(cached) is not None else None
+
+    return FLIGHTS.do(key, fetch, recheck)
+
+
+def get_current_prices(symbols, max_age=PRICE_TTL):
+    """Resolve prices, currencies and PLN FX rates for ``symbols``.
+
+    Cached quotes are read from ``price:{symbol}`` in one bulk call; misses are
+    fetched on a bounded thread pool, and a symbol another thread or request
+    is already fetching is waited for rather than fetched twice.
+    A ``max_age`` below ``PRICE_TTL`` treats older quotes as misses, which the
+    background refresher uses to renew entries before they expire.
+    """
     prices = {}
     currencies = {}
     fx_rates = {}
-    currency_cache = {}
+
+    ordered = []
     for symbol in symbols:
-        if not symbol:
+        if symbol and symbol not in ordered:
+            ordered.append(symbol)
+
+    cached = CACHE.get_many([f"price:{symbol}" for symbol in ordered], max_age)
+    misses = []
+    for symbol in ordered:
+        hit = _read_cached_quote(cached.get(f"price:{symbol}"))
+        if hit is None:
+            misses.append(symbol)
             continue
-
-        cached = CACHE.get(f"price:{symbol}", PRICE_TTL)
-        price = None
-        currency = None
-        raw_currency = None
-        cache_hit = False
-
-        if isinstance(cached, dict):
-            price = cached.get("price")
-            currency = cached.get("currency")
-            raw_currency = cached.get("raw_currency")
-            cache_hit = price is not None and currency is not None
-        elif cached:
-            # Legacy cache format (list/tuple) – force refresh to avoid re-scaling issues
-            cache_hit = False
-
-        if cache_hit:
-            try:
-                price = float(price)
-            except (TypeError, ValueError):
-                price = None
-                cache_hit = False
-
-        if not cache_hit:
-            try:
-                ticker = yf.Ticker(symbol)
-                info = getattr(ticker, "fast_info", None)
-                if info:
-                    price = (
-                        info.get("lastPrice")
-                        or info.get("regularMarketPrice")
-                        or info.get("previousClose")
-                    )
-                    currency = info.get("currency") or info.get("lastCurrency")
-                    raw_currency = currency
-                if price is None:
-                    hist = ticker.history(period="1d")
-                    if not hist.empty:
-                        price = hist['Close'][-1]
-                if currency is None:
-                    currency = getattr(ticker, "info", {}).get("currency")
-                if raw_currency is None:
-                    raw_currency = currency
-            except Exception:
-                price = None
-                currency = None
-                raw_currency = None
-
-        price = _safe_float(price)
-        normalized_currency = _normalize_currency(currency)
-
-        if not cache_hit and raw_currency:
-            if raw_currency in ("GBX", "GBp") and price:
-                price = float(price) / 100.0
-                normalized_currency = "GBP"
-            elif raw_currency == "GBP" and price and symbol in PENCE_TICKERS:
-                price = float(price) / 100.0
-            elif raw_currency == "GBP" and price:
-                price = float(price)
-
-        currency = normalized_currency
-        prices[symbol] = float(price)
-        currencies[symbol] = currency
-
-        if currency in currency_cache:
-            fx_rates[symbol] = currency_cache[currency]
-        else:
-            fx_rate = _get_fx_rate_to_pln(currency)
-            fx_rates[symbol] = fx_rate
-            currency_cache[currency] = fx_rate
-
-        CACHE.set(
-            f"price:{symbol}",
-            {
-                "price": prices[symbol],
-                "currency": currency,
-                "raw_currency": raw_currency,
-                "cache_version": 2,
-            },
-        )
+        price, currency = hit
+        prices[symbol] = price
+        currencies[symbol] = _normalize_currency(currency)
+
+    fetched = _run_concurrently(lambda symbol: _load_quote(symbol, max_age), misses)
+    for symbol, entry in fetched.items():
+        price, currency = _read_cached_quote(entry)
+        prices[symbol] = price
+        currencies[symbol] = _normalize_currency(currency)
+
+    rates_by_currency = _get_fx_rates_to_pln(currencies.values())
+    for symbol in ordered:
+        fx_rates[symbol] = rates_by_currency[currencies[symbol]]
     return prices, currencies, fx_rates
 
 
+def _resolve_logo(asset: str, candidates, max_wait=None):
+    """Mirror the first Twelve Data logo found for ``candidates``; fall back to initials.
 
-
-def _avatar_placeholder(asset: str) -> str:
-    identifier = (asset or "").strip()
-    if not identifier:
-        return f"https://ui-avatars.com/api/?name=?&background={AVATAR_BACKGROUND}&color={AVATAR_COLOR}&size=64&bold=true"
-    parts = identifier.replace("_", " ").split()
-    initials = "".join(part[0] for part in parts if part)
-    initials = (initials or identifier[:2]).upper()
-    return (
-        "https://ui-avatars.com/api/"
-        f"?name={initials}&background={AVATAR_BACKGROUND}&color={AVATAR_COLOR}&size=64&bold=true"
-    )
-
-def get_logo_url(asset: str) -> str:
-    """Return cached Twelve Data logo URL for the asset if available."""
-    if not asset:
-        return ""
-
-    cache_key = f"logo:{asset}"
-    cached = CACHE.get(cache_key, LOGO_TTL)
-    if cached is not None:
-        return cached
-
-    for symbol in build_twelvedata_candidates(asset):
+    Returns ``(filename, final)``. ``final`` is False when the placeholder is
+    only standing in for a lookup or download that failed, so it should be
+    retried rather than kept for ``LOGO_TTL``. Raises ``RateLimited`` if the
+    credits for a lookup are not free within ``max_wait`` seconds.
+    """
+    final = True
+    for symbol in candidates:
         try:
-            data = fetch_logo(symbol)
+            data = fetch_logo(symbol, max_wait=max_wait)
+        except RateLimited:
+            raise
         except Exception:
+            final = False
             continue
-        logo_url = None
+        remote_url = None
         if isinstance(data, dict):
             if data.get('status') == 'error':
                 continue
-            logo_url = data.get('url') or data.get('logo')
-        if logo_url:
-            CACHE.set(cache_key, logo_url)
-            return logo_url
+            remote_url = data.get('url') or data.get('logo')
+        if remote_url:
+            filename = download_image(remote_url)
+            if filename:
+                return filename, True
+            final = False
+    return placeholder_image(asset), final
+
+
+def _read_cached_logo(cached):
+    """Return the mirrored file name from a ``logo:{asset}`` entry, or None on a miss."""
+    if not isinstance(cached, dict):
+        # Legacy entries hold remote URLs; resolve again so the image gets mirrored
+        return None
+    filename = cached.get("file")
+    if not filename or not logo_path(filename).exists():
+        return None
+    if cached.get("retry_at", float("inf")) <= time.time():
+        return None
+    return filename
+
+
+def _load_logo(asset, candidates, max_age, max_wait):
+    """Resolve and cache one ``logo:{asset}`` entry, once across concurrent callers."""
+    key = f"logo:{asset}"
+
+    def fetch():
+        try:
+            filename, final = _resolve_logo(asset, candidates, max_wait)
+        except RateLimited:
+            # Twelve Data credits are taken (e.g. by a dividend refresh): show the
+            # last mirrored logo or the initials, and leave the entry for a later load
+            stale = CACHE.get(key, float("inf"))
+            filename = stale.get("file") if isinstance(stale, dict) else None
+            if filename and logo_path(filename).exists():
+                return filename
+            return placeholder_image(asset)
+        entry = {"file": filename}
+        if not final:
+            entry["retry_at"] = time.time() + LOGO_RETRY_SECONDS
+        CACHE.set(key, entry, ttl=LOGO_TTL)
+        return filename
+
+    return FLIGHTS.do(key, fetch, lambda: _read_cached_logo(CACHE.get(key, max_age)))
+
+
+def get_logo_url(asset: str) -> str:
+    """Return the local URL of the mirrored logo (or initials placeholder) for the asset."""
+    if not asset:
+        return ""
+    return get_logo_urls([asset])[asset]
+
+
+def get_logo_urls(assets, max_age=LOGO_TTL, max_wait=INTERACTIVE_WAIT) -> dict:
+    """Return ``{asset: local_logo_url}``; misses are resolved and mirrored concurrently.
+
+    A miss waits at most ``max_wait`` seconds for Twelve Data credits before
+    falling back to the last mirrored logo or the placeholder; pass None to
+    queue for as long as it takes.
+    """
+    ordered = [asset for asset in dict.fromkeys(assets) if asset]
+    cached = CACHE.get_many([f"logo:{asset}" for asset in ordered], max_age)
+    files = {}
+    misses = []
+    for asset in ordered:
+        filename = _read_cached_logo(cached.get(f"logo:{asset}"))
+        if filename is None:
+            misses.append(asset)
+        else:
+            files[asset] = filename
 
-    placeholder = _avatar_placeholder(asset)
-    CACHE.set(cache_key, placeholder)
-    return placeholder
+    # Candidates read symbol_mappings, so resolve them here rather than in the workers
+    candidates = {asset: build_twelvedata_candidates(asset) for asset in misses}
+    files.update(
+        _run_concurrently(
+            lambda asset: _load_logo(asset, candidates[asset], max_age, max_wait), misses
+        )
+    )
+    return {asset: logo_url(files[asset]) for asset in ordered}
 
 
+def get_event_dates(symbol, max_age=EVENT_TTL):
+    key = f"events:{symbol}"
+    return FLIGHTS.do(key, lambda: _fetch_event_dates(symbol), lambda: CACHE.get(key, max_age) or None)
 
-def get_event_dates(symbol):
-    cached = CACHE.get(f"events:{symbol}", EVENT_TTL)
-    if cached:
-        return cached
+
+def _fetch_event_dates(symbol):
     try:
         ticker = yf.Ticker(symbol)
         info = ticker.get_info()
@@ -335,7 +528,7 @@ def get_event_dates(symbol):
         ]
         if edates:
             events['future_earnings_dates'] = edates
-    CACHE.set(f"events:{symbol}", events)
+    CACHE.set(f"events:{symbol}", events, ttl=EVENT_TTL)
     return events
 
 
@@ -360,9 +553,35 @@ def calculate_profit_loss(current_value, investment_cost):
     return pln, perc
 
 
-def build_profit_timeseries(transactions, asset_fx_rates=None, current_price_map=None):
+def _forward_fill(values):
+    """Carry the last non-NaN value down axis 0; leading gaps become 0."""
+    shape = (-1,) + (1,) * (values.ndim - 1)
+    rows = np.arange(values.shape[0]).reshape(shape)
+    index = np.where(np.isnan(values), 0, rows)
+    np.maximum.accumulate(index, axis=0, out=index)
+    return np.nan_to_num(np.take_along_axis(values, index, axis=0), nan=0.0)
+
+
+def compute_profit_components(transactions, asset_fx_rates=None, current_price_map=None, from_date=None):
+    """Return daily equity P/L components from ``from_date`` (or the first trade) to today.
+
+    The result is a dict with ``start`` (the first day covered) and equally
+    long ``realized``, ``unrealized`` and ``market_value`` NumPy arrays in PLN,
+    or None when there are no usable transactions. The full ledger is always
+    replayed, so a window's values match the tail of a full computation.
+    ``priced`` is a boolean array, True on days where every held asset was
+    valued from a historical close that will not change: the day has its own
+    close, or falls on or before the symbol's last stored close. Days carried
+    forward past it (tail not downloaded yet, or the download failed) are
+    valued the same way but not priced. Leading days with no close yet
+    because the market was shut count as priced and take the first close.
+    This is the one deliberate difference from the per-day loop this
+    replaced, which valued them at the current quote: it only applies to
+    days inside the range ``price_history_sync`` marks as answered by the
+    provider.
+    """
     if not transactions:
-        return []
+        return None
 
     parsed = []
     assets = set()
@@ -398,86 +617,141 @@ def build_profit_timeseries(transactions, asset_fx_rates=None, current_price_map
         asset_currency.setdefault(asset, currency)
 
     if not parsed:
-        return []
+        return None
 
     parsed.sort(key=lambda item: (item["date"], item["id"]))
     start_date = parsed[0]["date"]
     end_date = max(parsed[-1]["date"], date_cls.today())
+    window_start = max(start_date, from_date) if from_date else start_date
+    if window_start > end_date:
+        return None
 
     if asset_fx_rates is None:
         asset_fx_rates = get_fx_rates_for_assets(asset_currency)
 
-    price_histories = {}
-    for asset in assets:
-        series = _get_price_history(asset, start_date, end_date)
-        if asset in PENCE_TICKERS:
-            series = [(day, price / 100.0) for day, price in series]
-        price_histories[asset] = series
-    price_indexes = {asset: 0 for asset in assets}
-    last_price = {asset: None for asset in assets}
-
+    price_histories = _run_concurrently(
+        lambda asset: _get_price_history(asset, start_date, end_date, read_from=window_start),
+        assets,
+    )
+    sync_states = PRICE_HISTORY.sync_states(assets)
+
+    asset_list = list(assets)
+    columns = {asset: index for index, asset in enumerate(asset_list)}
+    n_days = (end_date - window_start).days + 1
+    n_assets = len(asset_list)
+
+    # Replay the ledger once, recording each asset's state on the days it
+    # changes; everything before the window collapses onto its first day.
+    qty = np.full((n_days, n_assets), np.nan)
+    cost_pln = np.full((n_days, n_assets), np.nan)
+    realized = np.full(n_days, np.nan)
     positions = {
         asset: {"qty": 0.0, "cost_local": 0.0, "cost_pln": 0.0} for asset in assets
     }
     realized_profit_pln = 0.0
+    for tx in parsed:
+        asset = tx["asset"]
+        fx_rate = asset_fx_rates.get(asset, 1.0)
+        record = positions[asset]
+        quantity = tx["quantity"]
+        price = tx["price"]
+        if tx["type"] == "buy":
+            record["qty"] += quantity
+            record["cost_local"] += quantity * price
+            record["cost_pln"] += quantity * price * fx_rate
+        elif tx["type"] == "sell":
+            available_qty = record["qty"]
+            if available_qty > 0:
+                sell_qty = min(quantity, available_qty)
+                avg_cost_local = record["cost_local"] / available_qty if available_qty else 0.0
+                avg_cost_pln = record["cost_pln"] / available_qty if available_qty else 0.0
+                record["qty"] -= sell_qty
+                record["cost_local"] -= sell_qty * avg_cost_local
+                record["cost_pln"] -= sell_qty * avg_cost_pln
+                proceeds_pln = sell_qty * price * fx_rate
+                realized_profit_pln += proceeds_pln - sell_qty * avg_cost_pln
+                if abs(record["cost_local"]) < 1e-8:
+                    record["cost_local"] = 0.0
+                if abs(record["cost_pln"]) < 1e-8:
+                    record["cost_pln"] = 0.0
+        day_index = max((tx["date"] - window_start).days, 0)
+        column = columns[asset]
+        qty[day_index, column] = record["qty"]
+        cost_pln[day_index, column] = record["cost_pln"]
+        realized[day_index] = realized_profit_pln
+
+    qty = _forward_fill(qty)
+    cost_pln = _forward_fill(cost_pln)
+    realized = _forward_fill(realized)
+
+    # Last known close on or before each day, falling back to the current quote.
+    day_ordinals = window_start.toordinal() + np.arange(n_days)
+    prices = np.full((n_days, n_assets), np.nan)
+    settled = np.zeros((n_days, n_assets), dtype=bool)
+    for column, asset in enumerate(asset_list):
+        history_days, history_prices = price_histories[asset]
+        if len(history_days):
+            if asset in PENCE_TICKERS:
+                history_prices = history_prices / 100.0
+            position = np.searchsorted(history_days, day_ordinals, side="right") - 1
+            prices[:, column] = np.where(
+                position >= 0, history_prices[np.maximum(position, 0)], np.nan
+            )
+            # Days before the first close inside a range the provider has answered
+            # for (a trade on a weekend or holiday) take the first session's close;
+            # days outside it are a missing download and stay unpriced.
+            state = sync_states.get(asset)
+            settled[:, column] = history_days[np.maximum(position, 0)] == day_ordinals
+            if state is not None:
+                leading = (position < 0) & (day_ordinals >= state[0].toordinal())
+                prices[leading, column] = history_prices[0]
+                if state[1] is not None:
+                    settled[:, column] |= ~np.isnan(prices[:, column]) & (
+                        day_ordinals <= state[1].toordinal()
+                    )
+    has_close = ~np.isnan(prices)
+    for column, asset in enumerate(asset_list):
+        fallback = current_price_map.get(asset) if current_price_map else None
+        if fallback is not None:
+            prices[~has_close[:, column], column] = fallback
+
+    fx_rates = np.array([asset_fx_rates.get(asset, 1.0) for asset in asset_list], dtype=float)
+    price_pln = prices * fx_rates
+    held = (qty > 0) & ~np.isnan(prices)
+
+    # Accumulate column by column so the float summation order matches the
+    # per-asset loop this replaced and the rounded output stays identical.
+    unrealized = np.zeros(n_days)
+    market_value = np.zeros(n_days)
+    for column in range(n_assets):
+        value = qty[:, column] * price_pln[:, column]
+        unrealized += np.where(held[:, column], value - cost_pln[:, column], 0.0)
+        market_value += np.where(held[:, column], value, 0.0)
+
+    return {
+        "start": window_start,
+        "realized": realized,
+        "unrealized": unrealized,
+        "market_value": market_value,
+        "priced": np.all(settled | ~(qty > 0), axis=1),
+    }
 
-    profit_series = []
-    tx_index = 0
-    total_transactions = len(parsed)
-    day = start_date
-    while day <= end_date:
-        while tx_index < total_transactions and parsed[tx_index]["date"] <= day:
-            tx = parsed[tx_index]
-            asset = tx["asset"]
-            fx_rate = asset_fx_rates.get(asset, 1.0)
-            record = positions.setdefault(asset, {"qty": 0.0, "cost_local": 0.0, "cost_pln": 0.0})
-            quantity = tx["quantity"]
-            price = tx["price"]
-            if tx["type"] == "buy":
-                record["qty"] += quantity
-                record["cost_local"] += quantity * price
-                record["cost_pln"] += quantity * price * fx_rate
-            elif tx["type"] == "sell":
-                available_qty = record["qty"]
-                if available_qty > 0:
-                    sell_qty = min(quantity, available_qty)
-                    avg_cost_local = record["cost_local"] / available_qty if available_qty else 0.0
-                    avg_cost_pln = record["cost_pln"] / available_qty if available_qty else 0.0
-                    record["qty"] -= sell_qty
-                    record["cost_local"] -= sell_qty * avg_cost_local
-                    record["cost_pln"] -= sell_qty * avg_cost_pln
-                    proceeds_pln = sell_qty * price * fx_rate
-                    realized_profit_pln += proceeds_pln - sell_qty * avg_cost_pln
-                    if abs(record["cost_local"]) < 1e-8:
-                        record["cost_local"] = 0.0
-                    if abs(record["cost_pln"]) < 1e-8:
-                        record["cost_pln"] = 0.0
-            tx_index += 1
-
-        unrealized_pln = 0.0
-        for asset, record in positions.items():
-            qty = record["qty"]
-            if qty <= 0:
-                continue
-            series = price_histories.get(asset, [])
-            idx = price_indexes.get(asset, 0)
-            while idx < len(series) and series[idx][0] <= day:
-                last_price[asset] = series[idx][1]
-                idx += 1
-            price_indexes[asset] = idx
-            price_local = last_price.get(asset)
-            if price_local is None and current_price_map:
-                price_local = current_price_map.get(asset)
-            if price_local is None:
-                continue
-            fx_rate = asset_fx_rates.get(asset, 1.0)
-            price_pln = price_local * fx_rate
-            unrealized_pln += qty * price_pln - record["cost_pln"]
-        total_profit = realized_profit_pln + unrealized_pln
-        profit_series.append({"date": day.isoformat(), "value": round(total_profit, 2)})
-        day += timedelta(days=1)
-
-    return profit_series
+
+def profit_points(start, realized, unrealized):
+    """Turn daily realized/unrealized P/L into ``[{"date", "value"}]`` chart points."""
+    n_days = len(realized)
+    day_labels = np.datetime_as_string(np.datetime64(start, "D") + np.arange(n_days)).tolist()
+    totals = (np.asarray(realized, dtype=float) + np.asarray(unrealized, dtype=float)).tolist()
+    return [
+        {"date": day, "value": round(total, 2)} for day, total in zip(day_labels, totals)
+    ]
+
+
+def build_profit_timeseries(transactions, asset_fx_rates=None, current_price_map=None):
+    components = compute_profit_components(transactions, asset_fx_rates, current_price_map)
+    if components is None:
+        return []
+    return profit_points(components["start"], components["realized"], components["unrealized"])
 
 
 
@@ -0,0 +1,363 @@
+import csv
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from cache_store import SQL_BATCH_SIZE
+from db import bump_data_version
+from dividend_helpers import reconcile_dividend_shares
+from position_helpers import replay_assets
+from snapshot_helpers import invalidate_snapshots
+
+IMPORT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+HEADER_SEARCH_LINES = 50  # broker exports may start with account details before the header
+DELIMITERS = ",;\t"
+CATEGORIES = ("Stock", "ETF", "Bond", "Crypto")
+
+# Exchange suffixes in broker exports -> (Yahoo suffix, trading currency)
+XTB_SUFFIXES = {
+    "US": ("", "USD"),
+    "PL": (".WA", "PLN"),
+    "UK": (".L", "GBP"),
+    "DE": (".DE", "EUR"),
+    "FR": (".PA", "EUR"),
+    "NL": (".AS", "EUR"),
+    "ES": (".MC", "EUR"),
+    "IT": (".MI", "EUR"),
+}
+MBANK_EXCHANGES = {
+    "GPW": ".WA",
+    "WWA": ".WA",
+    "NEWCONNECT": ".WA",
+    "LSE": ".L",
+    "XETRA": ".DE",
+    "EURONEXT PARIS": ".PA",
+    "EURONEXT AMSTERDAM": ".AS",
+}
+
+
+def _xtb_symbol(row):
+    symbol = row["asset"].upper()
+    base, _, market = symbol.rpartition(".")
+    if base and market in XTB_SUFFIXES:
+        suffix, currency = XTB_SUFFIXES[market]
+        return base + suffix, row.get("currency") or currency
+    return symbol, row.get("currency")
+
+
+def _mbank_symbol(row):
+    suffix = MBANK_EXCHANGES.get((row.get("exchange") or "").strip().upper(), "")
+    return row["asset"].upper() + suffix, row.get("currency")
+
+
+def _plain_symbol(row):
+    return row["asset"].upper(), row.get("currency")
+
+
+@dataclass(frozen=True)
+class BrokerFormat:
+    """How one broker's CSV export maps onto transaction fields.
+
+    ``columns`` lists accepted header names per field (first match wins);
+    ``date`` and ``asset`` must be present, the others are optional where a
+    default exists.
+    """
+
+    label: str
+    columns: Dict[str, Sequence[str]]
+    date_formats: Sequence[str]
+    types: Dict[str, str]
+    encoding: str = "utf-8-sig"
+    symbol: Callable[[dict], Tuple[str, Optional[str]]] = _plain_symbol
+    default_currency: Optional[str] = None
+    categories: Dict[str, str] = field(default_factory=dict)
+
+
+BROKER_FORMATS = {
+    "finly": BrokerFormat(
+        label="Finly export",
+        columns={
+            "date": ("date",),
+            "asset": ("asset",),
+            "type": ("type",),
+            "quantity": ("quantity",),
+            "price": ("price",),
+            "currency": ("currency",),
+            "category": ("category",),
+        },
+        date_formats=("%Y-%m-%d",),
+        types={"buy": "buy", "sell": "sell"},
+    ),
+    "mbank": BrokerFormat(
+        label="mBank eMakler",
+        columns={
+            "date": ("Czas transakcji", "Data transakcji", "Data"),
+            "asset": ("Walor", "Papier"),
+            "exchange": ("Giełda", "Gielda", "Rynek"),
+            "type": ("K/S", "Kierunek"),
+            "quantity": ("Liczba", "Ilość", "Ilosc"),
+            "price": ("Kurs", "Cena"),
+            "currency": ("Waluta",),
+        },
+        date_formats=("%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y"),
+        types={"k": "buy", "kupno": "buy", "s": "sell", "sprzedaż": "sell", "sprzedaz": "sell"},
+        encoding="cp1250",
+        symbol=_mbank_symbol,
+        default_currency="PLN",
+    ),
+    "xtb": BrokerFormat(
+        label="XTB",
+        columns={
+            "date": ("Open time", "Time", "Czas otwarcia", "Czas"),
+            "asset": ("Symbol",),
+            "type": ("Type", "Typ"),
+            "quantity": ("Volume", "Wolumen"),
+            "price": ("Open price", "Price", "Cena otwarcia", "Cena"),
+            "currency": ("Currency", "Waluta"),
+        },
+        date_formats=("%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%d.%m.%Y"),
+        types={"buy": "buy", "kupno": "buy", "sell": "sell", "sprzedaż": "sell"},
+        symbol=_xtb_symbol,
+        default_currency="PLN",
+    ),
+    "ibkr": BrokerFormat(
+        label="Interactive Brokers (Flex trades)",
+        columns={
+            "date": ("TradeDate", "Date/Time", "DateTime", "Trade Date"),
+            "asset": ("Symbol",),
+            "type": ("Buy/Sell",),
+            "quantity": ("Quantity",),
+            "price": ("TradePrice", "T. Price", "Price"),
+            "currency": ("CurrencyPrimary", "Currency"),
+            "category": ("AssetClass", "Asset Category"),
+        },
+        date_formats=("%Y%m%d", "%Y-%m-%d, %H:%M:%S", "%Y%m%d;%H%M%S", "%Y-%m-%d"),
+        types={"buy": "buy", "sell": "sell"},
+        categories={"stk": "Stock", "stocks": "Stock", "bond": "Bond", "bonds": "Bond", "crypto": "Crypto"},
+    ),
+}
+
+
+class CsvImportError(ValueError):
+    """The file cannot be imported at all (unknown broker, no header row)."""
+
+
+def parse_number(value):
+    """Parse ``1 234,56``, ``1,234.56`` and ``-12.5`` style numbers."""
+    text = (value or "").strip().replace("\xa0", "").replace(" ", "")
+    if "," in text and "." in text:
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    else:
+        text = text.replace(",", ".")
+    return float(text)
+
+
+def _parse_date(value, formats):
+    value = (value or "").strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return datetime.fromisoformat(value).date()
+
+
+def _read_header(lines, fmt):
+    """Consume ``lines`` up to the header row; return ``(header_line_no, delimiter, {field: index})``."""
+    for line_no, line in enumerate(islice(lines, HEADER_SEARCH_LINES), start=1):
+        if not line.strip():
+            continue
+        delimiter = max(DELIMITERS, key=line.count)
+        header = [name.strip().strip('"').lstrip("\ufeff") for name in next(csv.reader([line], delimiter=delimiter))]
+        lookup = {name.lower(): index for index, name in enumerate(header)}
+        indexes = {}
+        for name, aliases in fmt.columns.items():
+            for alias in aliases:
+                if alias.lower() in lookup:
+                    indexes[name] = lookup[alias.lower()]
+                    break
+        if "date" in indexes and "asset" in indexes:
+            return line_no, delimiter, indexes
+    raise CsvImportError(f"No {fmt.label} header row found in the first {HEADER_SEARCH_LINES} lines.")
+
+
+def read_rows(lines, fmt):
+    """Yield ``(line_no, {field: value})`` for each data row, streaming ``lines``."""
+    lines = iter(lines)
+    header_line, delimiter, indexes = _read_header(lines, fmt)
+    for offset, values in enumerate(csv.reader(lines, delimiter=delimiter), start=1):
+        if not any(value.strip() for value in values):
+            continue
+        yield header_line + offset, {
+            name: values[index].strip() if index < len(values) else ""
+            for name, index in indexes.items()
+        }
+
+
+def parse_transactions(rows, fmt, report):
+    """Validate raw rows into transaction dicts; invalid rows are counted in ``report``."""
+    for line_no, row in rows:
+        report["read"] += 1
+        try:
+            tx = _parse_row(row, fmt)
+        except (ValueError, KeyError) as exc:
+            report["invalid"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append((line_no, str(exc) or exc.__class__.__name__))
+            continue
+        yield tx
+
+
+def _parse_row(row, fmt):
+    if not row.get("asset"):
+        raise ValueError("missing asset")
+    tx_date = _parse_date(row.get("date"), fmt.date_formats)
+    quantity = parse_number(row.get("quantity"))
+    price = parse_number(row.get("price"))
+
+    raw_type = (row.get("type") or "").strip().lower()
+    if raw_type:
+        tx_type = fmt.types.get(raw_type)
+        if tx_type is None:
+            raise ValueError(f"unknown transaction type {row.get('type')!r}")
+    else:
+        # Brokers that sign the quantity instead of naming the side
+        tx_type = "sell" if quantity < 0 else "buy"
+    quantity = abs(quantity)
+    if quantity <= 0 or price <= 0:
+        raise ValueError("quantity and price must be greater than zero")
+
+    asset, currency = fmt.symbol(row)
+    currency = (currency or fmt.default_currency or "").strip().upper()
+    if not currency:
+        raise ValueError("missing currency")
+    category = (row.get("category") or "").strip()
+    category = fmt.categories.get(category.lower(), category)
+    if category not in CATEGORIES:
+        category = "Stock"
+    return {
+        "date": tx_date.isoformat(),
+        "asset": asset,
+        "type": tx_type,
+        "quantity": quantity,
+        "price": price,
+        "currency": currency,
+        "category": category,
+    }
+
+
+def natural_key(tx):
+    return (
+        str(tx["date"])[:10],
+        tx["asset"],
+        tx["type"],
+        round(float(tx["quantity"]), 8),
+        round(float(tx["price"]), 8),
+        tx["currency"],
+    )
+
+
+def batched(items, size):
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _existing_counts(db, batch, max_id):
+    """Count rows that existed before the import for each natural key in ``batch``."""
+    pairs = sorted({(tx["asset"], tx["date"]) for tx in batch})
+    counts = Counter()
+    # Two variables per pair; stay within SQL_BATCH_SIZE so old SQLite builds
+    # (999-variable limit) accept the query
+    for chunk in batched(pairs, SQL_BATCH_SIZE // 2):
+        values = ",".join("(?, ?)" for _ in chunk)
+        # CROSS JOIN keeps the key list outermost: one (asset, date) index probe per
+        # pair. Older rows may carry a time ("2024-01-02T10:00"), so match the whole
+        # day as a range; '~' sorts after both ' ' and 'T', and a range keeps the index.
+        cur = db.execute(
+            f"""
+            WITH keys(asset, day) AS (VALUES {values})
+            SELECT t.date, t.asset, t.type, t.quantity, t.price, t.currency
+            FROM keys CROSS JOIN transactions AS t
+                ON t.asset = keys.asset AND t.date >= keys.day AND t.date < keys.day || '~'
+            WHERE t.id <= ?
+            """,
+            (*(value for pair in chunk for value in pair), max_id),
+        )
+        counts.update(
+            natural_key(dict(zip(("date", "asset", "type", "quantity", "price", "currency"), row)))
+            for row in cur
+        )
+    return counts
+
+
+def import_transactions(db, lines, broker, dry_run=False, batch_size=IMPORT_BATCH_SIZE):
+    """Stream a broker CSV into ``transactions`` inside one database transaction.
+
+    Rows are parsed lazily and inserted ``batch_size`` at a time, so memory
+    grows only with the batch plus one natural key per imported row. A row
+    is a duplicate when the ledger already held as many rows with the same
+    (date, asset, type, quantity, price, currency) as the file has seen so
+    far, so re-importing a file is a no-op while repeated identical fills
+    inside one file are kept. Afterwards snapshots, data versions, positions
+    and dividend shares are brought up to date, and everything commits
+    together (or is rolled back with ``dry_run``).
+    """
+    fmt = BROKER_FORMATS.get(broker)
+    if fmt is None:
+        raise CsvImportError(f"Unknown broker format: {broker}")
+
+    report = {"read": 0, "imported": 0, "duplicates": 0, "invalid": 0, "errors": [], "assets": 0}
+    max_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+    seen = Counter()
+    assets = set()
+    first_date = None
+
+    try:
+        for batch in batched(parse_transactions(read_rows(lines, fmt), fmt, report), batch_size):
+            existing = _existing_counts(db, batch, max_id)
+            rows = []
+            for tx in batch:
+                key = natural_key(tx)
+                seen[key] += 1
+                if seen[key] <= existing[key]:
+                    report["duplicates"] += 1
+                    continue
+                rows.append(
+                    (tx["date"], tx["asset"], tx["type"], tx["quantity"], tx["price"], tx["currency"], tx["category"])
+                )
+                assets.add(tx["asset"])
+                if first_date is None or tx["date"] < first_date:
+                    first_date = tx["date"]
+            db.executemany(
+                """
+                INSERT INTO transactions (date, asset, type, quantity, price, currency, category)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            report["imported"] += len(rows)
+
+        if report["imported"]:
+            invalidate_snapshots(db, first_date)
+            bump_data_version(db, "transactions")
+            replay_assets(db, assets)
+            reconcile_dividend_shares(db, assets)
+        report["assets"] = len(assets)
+    except BaseException:
+        db.rollback()
+        raise
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+    return report
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import requests
+
+from services import http_client
+
+LOGO_DIR = Path(os.environ.get("LOGO_DIR", Path(__file__).resolve().parent / "logo_cache"))
+LOGO_URL_PREFIX = "/logos/"
+LOGO_MAX_AGE = 365 * 24 * 60 * 60  # file names are content hashes, so they never change
+MAX_LOGO_BYTES = 512 * 1024
+
+AVATAR_BACKGROUND = "#0D8ABC"
+AVATAR_COLOR = "#fff"
+
+# Raster formats only: logos are served from the app's own origin, where a
+# remote SVG could run script. The only SVGs mirrored are our placeholders.
+CONTENT_TYPES = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/x-icon": ".ico",
+    "image/vnd.microsoft.icon": ".ico",
+}
+
+
+def logo_path(filename):
+    return LOGO_DIR / filename
+
+
+def logo_url(filename):
+    return f"{LOGO_URL_PREFIX}{filename}"
+
+
+def store_image(data: bytes, extension: str) -> str:
+    """Write ``data`` under its content hash and return the file name.
+
+    Identical images (e.g. one logo shared by several tickers) are stored once.
+    """
+    filename = f"{hashlib.sha256(data).hexdigest()[:32]}{extension}"
+    path = logo_path(filename)
+    if not path.exists():
+        LOGO_DIR.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=LOGO_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+    return filename
+
+
+def download_image(url: str):
+    """Download ``url`` into the mirror; return the file name, or None if it is not a usable image."""
+    try:
+        response = http_client.get(url)
+        response.raise_for_status()
+    except requests.RequestException:
+        return None
+    content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    extension = CONTENT_TYPES.get(content_type)
+    if extension is None or not response.content or len(response.content) > MAX_LOGO_BYTES:
+        return None
+    return store_image(response.content, extension)
+
+
+def initials(asset: str) -> str:
+    identifier = (asset or "").strip()
+    if not identifier:
+        return "?"
+    parts = identifier.replace("_", " ").split()
+    letters = "".join(part[0] for part in parts if part)
+    return (letters or identifier[:2]).upper()[:2]
+
+
+def placeholder_image(asset: str) -> str:
+    """Render an initials avatar as SVG into the mirror and return its file name."""
+    svg = (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="64" height="64" viewBox="0 0 64 64">'
+        f'<circle cx="32" cy="32" r="32" fill="{AVATAR_BACKGROUND}"/>'
+        '<text x="32" y="32" dy=".35em" text-anchor="middle" '
+        'font-family="Helvetica, Arial, sans-serif" font-size="26" font-weight="bold" '
+        f'fill="{AVATAR_COLOR}">{escape(initials(asset))}</text>'
+        "</svg>"
+    )
+    return store_image(svg.encode("utf-8"), ".svg")
@@ -0,0 +1,242 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import current_app
+
+from cache_store import CACHE
+from db import get_db
+from helpers import (
+    EVENT_TTL,
+    FX_TTL,
+    LOGO_TTL,
+    PRICE_TTL,
+    get_current_prices,
+    get_event_dates,
+    get_fx_rates_for_assets,
+    get_logo_urls,
+)
+from position_helpers import load_positions
+from routes.dividends import DIVIDEND_TTL, refresh_dividends
+from services import twelvedata
+
+LOGGER = logging.getLogger(__name__)
+
+REFRESH_ENABLED = os.environ.get("MARKET_REFRESH", "1").lower() not in ("0", "false", "no", "off")
+REFRESH_JITTER = float(os.environ.get("REFRESH_JITTER", 0.1))  # +/- fraction of each interval
+REFRESH_WAIT = 30  # seconds /refresh waits for a triggered cycle before returning
+
+
+def _interval(name, default):
+    return max(1, int(os.environ.get(f"REFRESH_{name.upper()}_SECONDS", default)))
+
+
+def _open_assets():
+    return sorted({asset for asset, _, _ in load_positions(get_db(), open_only=True)})
+
+
+def _asset_currency_map():
+    cur = get_db().execute(
+        """
+        SELECT asset, currency
+        FROM transactions
+        ORDER BY date ASC, id ASC
+        """
+    )
+    asset_currency_map = {}
+    for row in cur.fetchall():
+        if row["asset"]:
+            asset_currency_map.setdefault(row["asset"], row["currency"] or "PLN")
+    return asset_currency_map
+
+
+def _refresh_prices(max_age):
+    open_assets = _open_assets()
+    get_current_prices(open_assets, max_age=max_age)
+    return len(open_assets)
+
+
+def _refresh_fx(max_age):
+    asset_currency_map = _asset_currency_map()
+    get_fx_rates_for_assets(asset_currency_map, max_age=max_age)
+    return len(set(asset_currency_map.values()))
+
+
+def _refresh_logos(max_age):
+    open_assets = _open_assets()
+    series = [row[0] for row in get_db().execute("SELECT DISTINCT series FROM bonds")]
+    get_logo_urls(open_assets + series, max_age=max_age, max_wait=None)
+    return len(open_assets) + len(series)
+
+
+def _refresh_events(max_age):
+    open_assets = _open_assets()
+    for asset in open_assets:
+        get_event_dates(asset, max_age=max_age)
+    return len(open_assets)
+
+
+def _refresh_dividends(max_age):
+    if not twelvedata.TWELVE_API_KEY:
+        return 0
+    if CACHE.get("dividends:last_sync", max_age) is not None:
+        return 0
+    result = refresh_dividends(force=True)
+    return result.get("processed", 0)
+
+
+class RefreshJob:
+    def __init__(self, name, interval, ttl, func, forceable=False, background=False):
+        self.name = name
+        self.interval = interval
+        self.ttl = ttl
+        self.func = func
+        self.forceable = forceable  # a triggered cycle re-fetches everything, not just stale entries
+        # Paced by the Twelve Data budget, so a run can take many minutes; it gets
+        # its own thread so the cycle (and the price/FX jobs) never waits on it
+        self.background = background
+        self.next_run = 0.0
+        self.last_run = None
+        self.last_error = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def max_age(self):
+        """Entries older than this would expire before the next run, so renew them now."""
+        return max(0, self.ttl - self.interval * (1 + REFRESH_JITTER))
+
+    def schedule(self, now):
+        jitter = random.uniform(-REFRESH_JITTER, REFRESH_JITTER) if REFRESH_JITTER else 0.0
+        self.next_run = now + self.interval * (1 + jitter)
+
+
+class MarketRefresher:
+    """Daemon thread that renews cached market data for held assets ahead of expiry.
+
+    Each job runs on its own interval (with jitter, so jobs and processes do
+    not line up) and re-fetches only the cache entries that would otherwise
+    expire before its next run. Several processes can run a refresher against
+    the same database; entries renewed by one are fresh for the others.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._app = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._cycle_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._forced = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app):
+        if not REFRESH_ENABLED or self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            self._app = app
+            self._thread = threading.Thread(target=self._loop, name="market-refresher", daemon=True)
+            self._thread.start()
+            LOGGER.info("Market data refresher started (%s)", ", ".join(
+                f"{job.name} every {job.interval}s" for job in self.jobs
+            ))
+
+    def trigger(self):
+        """Ask the background thread for an immediate forced cycle.
+
+        Returns an event that is set once the cycle has finished.
+        """
+        with self._lock:
+            if self._forced is None:
+                self._forced = threading.Event()
+            done = self._forced
+        self._wake.set()
+        return done
+
+    def run_cycle(self, force=False, due_only=False):
+        """Run every job (or only those due) in the current app context.
+
+        Background jobs are started on their own thread and not waited for;
+        one still running from an earlier cycle is left alone.
+        """
+        with self._cycle_lock:
+            now = time.time()
+            for job in self.jobs:
+                if due_only and job.next_run > now:
+                    continue
+                max_age = 0 if force and job.forceable else job.max_age
+                if not job.background:
+                    self._run_job(job, max_age)
+                elif not job.running:
+                    app = current_app._get_current_object()
+                    job._thread = threading.Thread(
+                        target=self._run_in_app, args=(app, job, max_age),
+                        name=f"market-refresher-{job.name}", daemon=True,
+                    )
+                    job._thread.start()
+                job.schedule(time.time())
+
+    def _run_in_app(self, app, job, max_age):
+        with app.app_context():
+            self._run_job(job, max_age)
+
+    @staticmethod
+    def _run_job(job, max_age):
+        started = time.time()
+        try:
+            count = job.func(max_age)
+            job.last_error = None
+            LOGGER.debug("Refreshed %s for %s items in %.2fs", job.name, count, time.time() - started)
+        except Exception as exc:
+            job.last_error = str(exc)
+            LOGGER.warning("Background %s refresh failed: %s", job.name, exc)
+        job.last_run = time.time()
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                done, self._forced = self._forced, None
+            try:
+                with self._app.app_context():
+                    self.run_cycle(force=done is not None, due_only=done is None)
+            except Exception:
+                LOGGER.exception("Market data refresh cycle failed")
+            finally:
+                if done is not None:
+                    done.set()
+            if self._forced is not None:
+                continue
+            delay = min(job.next_run for job in self.jobs) - time.time()
+            self._wake.wait(max(1.0, delay))
+            self._wake.clear()
+
+    def status(self):
+        return {
+            job.name: {
+                "interval": job.interval,
+                "last_run": job.last_run,
+                "next_run": job.next_run,
+                "last_error": job.last_error,
+                "running": job.running,
+            }
+            for job in self.jobs
+        }
+
+
+REFRESHER = MarketRefresher([
+    RefreshJob("prices", _interval("prices", PRICE_TTL // 2), PRICE_TTL, _refresh_prices, forceable=True),
+    RefreshJob("fx", _interval("fx", FX_TTL // 2), FX_TTL, _refresh_fx, forceable=True),
+    RefreshJob("events", _interval("events", EVENT_TTL // 4), EVENT_TTL, _refresh_events),
+    RefreshJob("dividends", _interval("dividends", DIVIDEND_TTL // 4), DIVIDEND_TTL, _refresh_dividends, background=True),
+    RefreshJob("logos", _interval("logos", LOGO_TTL // 7), LOGO_TTL, _refresh_logos, background=True),
+])
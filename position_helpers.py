@@ -0,0 +1,143 @@
+from db import get_data_versions
+from helpers import apply_to_position, new_position, position_key, summarize_positions
+
+TRANSACTION_COLUMNS = "id, date, asset, category, type, quantity, price, currency"
+
+
+def _fetch_transactions(db, where="", params=()):
+    cur = db.execute(
+        f"SELECT {TRANSACTION_COLUMNS} FROM transactions {where} ORDER BY date ASC, id ASC",
+        params,
+    )
+    return [dict(row) for row in cur.fetchall()]
+
+
+def _last_seen(transactions):
+    """Return ``{key: (date, id)}`` of the last transaction applied to each position."""
+    last = {}
+    for tx in transactions:
+        key = position_key(tx)
+        if key is not None:
+            last[key] = (str(tx["date"]), tx["id"])
+    return last
+
+
+def _write_positions(db, positions, last_seen):
+    db.executemany(
+        """
+        INSERT OR REPLACE INTO positions
+            (asset, category, currency, net_quantity, cost_basis, realized_pl, last_date, last_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (
+                *key,
+                data["net_quantity"],
+                data["cost_basis"],
+                data["realized_pl"],
+                *last_seen.get(key, (None, None)),
+            )
+            for key, data in positions.items()
+        ],
+    )
+
+
+def _mark_synced(db):
+    """Record that ``positions`` reflects the current transactions version."""
+    versions = get_data_versions(db)
+    db.execute(
+        "INSERT OR REPLACE INTO data_versions (name, version) VALUES ('positions', ?)",
+        (versions.get("transactions", 0),),
+    )
+
+
+def rebuild_positions(db) -> None:
+    """Replay the whole ledger into ``positions``."""
+    transactions = _fetch_transactions(db)
+    db.execute("DELETE FROM positions")
+    _write_positions(db, summarize_positions(transactions), _last_seen(transactions))
+    _mark_synced(db)
+
+
+def _never_built(db):
+    """True if ``positions`` has never been filled, so patching single assets would leave it partial."""
+    if get_data_versions(db).get("positions") is None:
+        rebuild_positions(db)
+        return True
+    return False
+
+
+def replay_assets(db, assets) -> None:
+    """Recompute the positions of ``assets`` only, e.g. after an edit or a back-dated trade."""
+    if _never_built(db):
+        return
+    assets = sorted({(asset or "").strip() for asset in assets} - {""})
+    if not assets:
+        _mark_synced(db)
+        return
+    placeholders = ",".join("?" for _ in assets)
+    transactions = _fetch_transactions(db, f"WHERE asset IN ({placeholders})", assets)
+    db.execute(f"DELETE FROM positions WHERE asset IN ({placeholders})", assets)
+    _write_positions(db, summarize_positions(transactions), _last_seen(transactions))
+    _mark_synced(db)
+
+
+def record_transaction(db, tx) -> None:
+    """Fold a newly inserted transaction (with its ``id``) into ``positions``.
+
+    Trades dated after the last one applied to their position are applied on
+    top of the stored row; back-dated trades replay that asset instead.
+    """
+    if _never_built(db):
+        return
+    key = position_key(tx)
+    if key is None:
+        _mark_synced(db)
+        return
+    row = db.execute(
+        """
+        SELECT net_quantity, cost_basis, realized_pl, last_date, last_id
+        FROM positions WHERE asset = ? AND category = ? AND currency = ?
+        """,
+        key,
+    ).fetchone()
+    tx_order = (str(tx["date"]), tx["id"])
+    if row is not None and row["last_date"] is not None and tx_order < (row["last_date"], row["last_id"]):
+        replay_assets(db, [key[0]])
+        return
+
+    position = new_position()
+    if row is not None:
+        position.update(
+            net_quantity=row["net_quantity"],
+            cost_basis=row["cost_basis"],
+            realized_pl=row["realized_pl"],
+        )
+    apply_to_position(position, tx)
+    _write_positions(db, {key: position}, {key: tx_order})
+    _mark_synced(db)
+
+
+def load_positions(db, open_only=False):
+    """Return positions in the shape of ``summarize_positions``.
+
+    The table is rebuilt first if it is missing rows from writes that did not
+    go through the helpers above (older databases, manual edits).
+    """
+    versions = get_data_versions(db)
+    if versions.get("positions") is None or versions["positions"] != versions.get("transactions", 0):
+        rebuild_positions(db)
+        db.commit()
+
+    where = "WHERE net_quantity > 0" if open_only else ""
+    cur = db.execute(
+        f"SELECT asset, category, currency, net_quantity, cost_basis, realized_pl FROM positions {where}"
+    )
+    return {
+        (row["asset"], row["category"], row["currency"]): {
+            "net_quantity": row["net_quantity"],
+            "cost_basis": row["cost_basis"],
+            "realized_pl": row["realized_pl"],
+        }
+        for row in cur.fetchall()
+    }
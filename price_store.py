@@ -0,0 +1,145 @@
+import time
+from datetime import date
+
+import numpy as np
+
+from cache_store import SQL_BATCH_SIZE
+from db import DB_PATH, pooled_connection
+
+# julianday() of a day minus this is its proleptic ordinal, as date.toordinal()
+JULIAN_ORDINAL_OFFSET = 1721424.5
+
+
+class PriceHistoryStore:
+    """Append-only store of daily closes, one row per (symbol, day).
+
+    ``price_history_sync`` records, per symbol, the earliest day that has been
+    requested from the provider, the last day with a stored close and when the
+    symbol was last fetched. Callers use it to download only the missing head
+    or tail of a range instead of the whole history.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = str(db_path)
+
+    def _connection(self):
+        return pooled_connection(self.db_path)
+
+    @staticmethod
+    def _parse_state(covered_from, last_day, fetched_at):
+        return (
+            date.fromisoformat(covered_from),
+            date.fromisoformat(last_day) if last_day else None,
+            fetched_at,
+        )
+
+    def sync_state(self, symbol):
+        """Return ``(covered_from, last_day, fetched_at)`` or None if never fetched."""
+        row = self._connection().execute(
+            "SELECT covered_from, last_day, fetched_at FROM price_history_sync WHERE symbol = ?",
+            (symbol,),
+        ).fetchone()
+        return self._parse_state(*row) if row else None
+
+    def sync_states(self, symbols):
+        """Return ``{symbol: sync_state}`` for the fetched ones among ``symbols``."""
+        symbols = list(dict.fromkeys(symbols))
+        conn = self._connection()
+        states = {}
+        for start in range(0, len(symbols), SQL_BATCH_SIZE):
+            chunk = symbols[start:start + SQL_BATCH_SIZE]
+            placeholders = ",".join("?" for _ in chunk)
+            for symbol, *state in conn.execute(
+                f"""
+                SELECT symbol, covered_from, last_day, fetched_at FROM price_history_sync
+                WHERE symbol IN ({placeholders})
+                """,
+                chunk,
+            ):
+                states[symbol] = self._parse_state(*state)
+        return states
+
+    def append(self, symbol, series, covered_from, fetched=True):
+        """Upsert ``(day, close)`` rows and advance the symbol's sync state.
+
+        ``covered_from`` is the earliest day requested from the provider so far;
+        only pass a range the provider actually answered, since it is never
+        requested again. ``fetched`` marks a tail refresh, which resets the
+        refresh clock.
+        """
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO price_history (symbol, day, close) VALUES (?, ?, ?)",
+                [(symbol, day.isoformat(), float(close)) for day, close in series],
+            )
+            last_day = conn.execute(
+                "SELECT MAX(day) FROM price_history WHERE symbol = ?", (symbol,)
+            ).fetchone()[0]
+            conn.execute(
+                """
+                INSERT INTO price_history_sync (symbol, covered_from, last_day, fetched_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET
+                    covered_from=MIN(price_history_sync.covered_from, excluded.covered_from),
+                    last_day=excluded.last_day,
+                    fetched_at=CASE WHEN ? THEN excluded.fetched_at ELSE price_history_sync.fetched_at END
+                """,
+                (symbol, covered_from.isoformat(), last_day, time.time(), 1 if fetched else 0),
+            )
+
+    def _read_rows(self, day_column, symbol, start_date, end_date, carry_in):
+        conn = self._connection()
+        rows = []
+        if carry_in:
+            rows = conn.execute(
+                f"""
+                SELECT {day_column}, close FROM price_history
+                WHERE symbol = ? AND day < ?
+                ORDER BY day DESC LIMIT 1
+                """,
+                (symbol, start_date.isoformat()),
+            ).fetchall()
+        rows += conn.execute(
+            f"""
+            SELECT {day_column}, close FROM price_history
+            WHERE symbol = ? AND day BETWEEN ? AND ?
+            ORDER BY day
+            """,
+            (symbol, start_date.isoformat(), end_date.isoformat()),
+        ).fetchall()
+        return rows
+
+    def read(self, symbol, start_date, end_date, carry_in=False):
+        """Return sorted ``(day, close)`` tuples for ``start_date..end_date`` inclusive.
+
+        With ``carry_in`` the last close before ``start_date`` is prepended.
+        """
+        rows = self._read_rows("day", symbol, start_date, end_date, carry_in)
+        return [(date.fromisoformat(day), close) for day, close in rows]
+
+    def read_arrays(self, symbol, start_date, end_date, carry_in=False):
+        """Like ``read``, but as ``(day ordinals, closes)`` NumPy arrays.
+
+        Days are converted by SQLite, so no Python object is built per close.
+        """
+        rows = self._read_rows(
+            f"CAST(julianday(day) - {JULIAN_ORDINAL_OFFSET} AS INTEGER)",
+            symbol, start_date, end_date, carry_in,
+        )
+        table = np.array(rows, dtype=float).reshape(-1, 2)
+        return table[:, 0].astype(np.int64), table[:, 1]
+
+    def clear(self, symbol=None):
+        conn = self._connection()
+        with conn:
+            if symbol is None:
+                conn.execute("DELETE FROM price_history")
+                conn.execute("DELETE FROM price_history_sync")
+            else:
+                conn.execute("DELETE FROM price_history WHERE symbol = ?", (symbol,))
+                conn.execute("DELETE FROM price_history_sync WHERE symbol = ?", (symbol,))
+
+
+# Create the global price history instance
+PRICE_HISTORY = PriceHistoryStore()
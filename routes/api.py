@@ -1,34 +1,55 @@
+from datetime import date
+
 import requests
 from flask import Blueprint, jsonify, request, current_app
 
+from cache_store import CACHE
+from db import get_data_versions, get_db
+from dashboard_helpers import data_version, load_section, make_etag, peek_section
+from export_helpers import PROFIT_COLUMNS, chunked, export_response, parse_export_format
 from helpers import get_event_dates, get_current_prices
+from services import http_client
+from symbol_index import SEARCH_LIMIT, SYMBOL_INDEX
 
 api_bp = Blueprint("api", __name__)
 
 
+def _yahoo_search(query):
+    url = "https://query2.finance.yahoo.com/v1/finance/search"
+    params = {"q": query, "quotesCount": SEARCH_LIMIT, "newsCount": 0, "lang": "en"}
+    resp = http_client.get(url, params=params, read_timeout=5)
+    resp.raise_for_status()
+    items = []
+    for item in resp.json().get("quotes", []):
+        if "symbol" in item and "shortname" in item:
+            items.append({
+                "ticker": item["symbol"],
+                "name": item["shortname"],
+                "exchange": item.get("exchange", ""),
+                "type": item.get("quoteType", "")
+            })
+    return items
+
+
 @api_bp.route('/yahoo-search')
 def yahoo_search():
+    """Autocomplete from the local symbol index; Yahoo is asked only for unseen queries."""
     query = request.args.get('q', '').strip()
     if not query:
         return jsonify([])
-    url = "https://query2.finance.yahoo.com/v1/finance/search"
-    params = {"q": query, "quotesCount": 10, "newsCount": 0, "lang": "en"}
-    try:
-        resp = requests.get(url, params=params, timeout=5)
-        resp.raise_for_status()
-        items = []
-        for item in resp.json().get("quotes", []):
-            if "symbol" in item and "shortname" in item:
-                items.append({
-                    "ticker": item["symbol"],
-                    "name": item["shortname"],
-                    "exchange": item.get("exchange", ""),
-                    "type": item.get("quoteType", "")
-                })
-        return jsonify(items)
-    except requests.RequestException as exc:
-        current_app.logger.warning("Yahoo search failed for '%s': %s", query, exc)
-        return jsonify([])
+    db = get_db()
+    versions = get_data_versions(db)
+    SYMBOL_INDEX.seed(db, (versions.get("transactions", 0), versions.get("symbol_mappings", 0)))
+
+    items = SYMBOL_INDEX.search(query)
+    if SYMBOL_INDEX.needs_remote(query, items):
+        try:
+            SYMBOL_INDEX.record_remote(query, _yahoo_search(query), "yahoo")
+        except requests.RequestException as exc:
+            current_app.logger.warning("Yahoo search failed for '%s': %s", query, exc)
+            return jsonify(items)
+        items = SYMBOL_INDEX.search(query)
+    return jsonify(items)
 
 
 @api_bp.route('/event-dates')
@@ -60,3 +81,107 @@ def get_currency():
         current_app.logger.info("No currency detected for %s", symbol)
         return jsonify({"error": "Currency not available"}), 404
     return jsonify({"currency": currency})
+
+
+def _section_response(name, serialize, *etag_parts):
+    """Serve a dashboard section as JSON with an ETag; 304 if the client copy is current."""
+    db = get_db()
+    version = data_version(db)
+    etag = make_etag(name, version, *etag_parts)
+    if etag in request.if_none_match and peek_section(name, version) is not None:
+        response = current_app.response_class(status=304)
+    else:
+        section, version = load_section(db, name)
+        etag = make_etag(name, version, *etag_parts)
+        response = jsonify(serialize(section))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api_bp.route('/dashboard/holdings')
+def dashboard_holdings():
+    return _section_response(
+        "holdings",
+        lambda section: {
+            "rows": section["rows"],
+            "equity_total_value": section["equity_total_value"],
+            "equity_profit_total": section["equity_profit_total"],
+        },
+    )
+
+
+@api_bp.route('/dashboard/allocation')
+def dashboard_allocation():
+    return _section_response("allocation", lambda section: section)
+
+
+@api_bp.route('/dashboard/bonds')
+def dashboard_bonds():
+    return _section_response("bonds", lambda section: section)
+
+
+@api_bp.route('/dashboard/cache-stats')
+def dashboard_cache_stats():
+    """Cache statistics change on every read and sweep, so they are never cached."""
+    try:
+        stats = CACHE.stats()
+    except Exception:
+        current_app.logger.exception("Cache statistics unavailable")
+        return jsonify({"error": "Cache statistics unavailable"}), 500
+    response = jsonify(stats)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def _series_range(args):
+    """Return the ``from``/``to`` ISO dates (or None); raise ValueError if malformed."""
+    start = args.get('from') or None
+    end = args.get('to') or None
+    for value in (start, end):
+        if value is not None:
+            date.fromisoformat(value)
+    return start, end
+
+
+def _series_points(series, start, end):
+    # ISO dates compare correctly as strings
+    return [
+        point for point in series
+        if (start is None or point["date"] >= start) and (end is None or point["date"] <= end)
+    ]
+
+
+@api_bp.route('/dashboard/profit-series')
+def dashboard_profit_series():
+    try:
+        start, end = _series_range(request.args)
+    except ValueError:
+        return jsonify({"error": "Dates must be in YYYY-MM-DD format"}), 400
+
+    def serialize(section):
+        return {"series": _series_points(section["series"], start, end), "total": section["total"]}
+
+    return _section_response("profit", serialize, start, end)
+
+
+@api_bp.route('/dashboard/profit-series/export')
+def export_profit_series():
+    """Download the daily profit series as CSV or JSON lines.
+
+    The series is computed (or read from the section cache) up front; only
+    its serialization is streamed.
+    """
+    fmt = parse_export_format(request.args)
+    if fmt is None:
+        return jsonify({"error": "Format must be csv or jsonl"}), 400
+    try:
+        start, end = _series_range(request.args)
+    except ValueError:
+        return jsonify({"error": "Dates must be in YYYY-MM-DD format"}), 400
+    section, _ = load_section(get_db(), "profit")
+    rows = [
+        (point["date"], point["value"])
+        for point in _series_points(section["series"], start, end)
+    ]
+    return export_response("profit", fmt, PROFIT_COLUMNS, chunked(rows))
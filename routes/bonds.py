@@ -2,7 +2,7 @@ from datetime import date
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 
-from db import get_db
+from db import get_db, bump_data_version
 from bond_helpers import parse_bond_row, calculate_accrual
 
 bonds_bp = Blueprint("bonds", __name__, url_prefix="/bonds")
@@ -81,6 +81,7 @@ def add_bond():
                 notes,
             ),
         )
+        bump_data_version(db, "bonds")
         db.commit()
         flash("Bond position added!", "success")
         return redirect(url_for("bonds.list_bonds"))
@@ -1,8 +1,9 @@
 from datetime import datetime
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, jsonify, render_template, request, redirect, url_for, flash
 
-from db import get_db
+from db import get_db, bump_data_version
+from export_helpers import CASH_COLUMNS, export_response, parse_export_format, query_rows
 
 cash_bp = Blueprint("cash", __name__)
 
@@ -60,6 +61,7 @@ def add_cash():
             (new_amount, 0.0, note, created_at)
         )
         recalculate_cash_deltas(db)
+        bump_data_version(db, "cash")
         db.commit()
         flash("Cash state added!", "success")
         return redirect(url_for('cash.cash_history'))
@@ -92,6 +94,7 @@ def edit_cash(deposit_id):
             (created_at, amount, note, deposit["id"] if use_mapping else deposit[0])
         )
         recalculate_cash_deltas(db)
+        bump_data_version(db, "cash")
         db.commit()
         flash("Cash entry updated!", "success")
         return redirect(url_for('cash.cash_history'))
@@ -118,3 +121,14 @@ def cash_history():
         deposits=deposits,
         current_balance=current_balance
     )
+
+
+@cash_bp.route('/export')
+def export_cash():
+    fmt = parse_export_format(request.args)
+    if fmt is None:
+        return jsonify({"error": "Format must be csv or jsonl"}), 400
+    rows = query_rows(
+        f"SELECT {', '.join(CASH_COLUMNS)} FROM cash_deposits ORDER BY created_at ASC, id ASC"
+    )
+    return export_response("cash", fmt, CASH_COLUMNS, rows)
@@ -1,13 +1,17 @@
 from __future__ import annotations
+import os
+import threading
 import time
 import logging
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, datetime
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, current_app, jsonify, render_template, request, redirect, url_for, flash
 
 from db import get_db
 from cache_store import CACHE
+from dividend_helpers import ensure_dividend_shares, reconcile_dividend_shares
+from export_helpers import DIVIDEND_COLUMNS, export_response, parse_export_format, query_rows
 from helpers import get_current_prices
 from services.twelvedata import fetch_dividends as td_fetch_dividends
 from symbol_utils import build_twelvedata_candidates
@@ -15,6 +19,10 @@ from symbol_utils import build_twelvedata_candidates
 dividends_bp = Blueprint("dividends", __name__, url_prefix="/dividends")
 DIVIDEND_TTL = 12 * 60 * 60  # 12 hours
 TAX_RATE = 0.19
+# Assets fetched concurrently; the shared Twelve Data budget paces the actual requests
+DIVIDEND_WORKERS = int(os.environ.get("DIVIDEND_WORKERS", 4))
+
+_REFRESH_LOCK = threading.Lock()
 
 LOGGER = logging.getLogger(__name__)
 
@@ -55,103 +63,16 @@ def parse_twelve_dividends(asset: str, data: dict):
 
 
 
-def _parse_date(value):
-    if not value:
-        return None
-    if isinstance(value, date):
-        return value
-    try:
-        return datetime.fromisoformat(value).date()
-    except ValueError:
-        try:
-            return datetime.strptime(value, '%Y-%m-%d').date()
-        except ValueError:
-            return None
-
-def _holdings_on_date(transactions, target_date, inclusive=True):
-    if target_date is None:
-        return None
-    net = 0.0
-    for tx_date, tx_type, qty in transactions:
-        if tx_date > target_date or (tx_date == target_date and not inclusive):
-            break
-        if tx_type == 'buy':
-            net += qty
-        elif tx_type == 'sell':
-            net -= qty
-    if net < 0:
-        net = 0.0
-    return round(net, 6)
-
-def _sync_dividend_shares(dividends):
-    if not dividends:
-        return {}
-
-    assets = {row['asset'] for row in dividends if row['asset']}
-    if not assets:
-        return {}
-
-    placeholders = ','.join('?' for _ in assets)
-    db = get_db()
-    cur = db.cursor()
-    cur.execute(
-        f"""
-        SELECT asset, date, type, quantity
-        FROM transactions
-        WHERE asset IN ({placeholders})
-        ORDER BY date ASC, id ASC
-        """,
-        list(assets),
-    )
-    tx_map = defaultdict(list)
-    for tx in cur.fetchall():
-        tx_date = _parse_date(tx['date'])
-        if not tx_date:
-            continue
-        tx_type = (tx['type'] or '').lower()
-        qty_raw = tx['quantity']
-        try:
-            qty = float(qty_raw)
-        except (TypeError, ValueError):
-            qty = 0.0
-        tx_map[tx['asset']].append((tx_date, tx_type, qty))
-
-    share_map = {}
-    updates = []
-    for row in dividends:
-        asset = row['asset']
-        if not asset:
-            continue
-        status = (row['status'] or 'synced') if 'status' in row.keys() else 'synced'
-        if status not in ('synced', 'manual'):
-            continue
-        ex_date_obj = _parse_date(row['ex_date'])
-        pay_date_obj = _parse_date(row['pay_date'])
-        snapshot_date = ex_date_obj or pay_date_obj
-        if not snapshot_date:
-            continue
-        inclusive = ex_date_obj is None
-        shares = _holdings_on_date(tx_map.get(asset, []), snapshot_date, inclusive=inclusive)
-        if shares is None:
-            continue
-        existing = row['shares'] or 0.0
-        if shares <= 1e-9 and existing > 0:
-            # keep manually entered value if the auto calculation returns zero
-            continue
-        share_map[row['id']] = shares
-        if abs(existing - shares) > 1e-6:
-            updates.append((shares, row['id']))
-
-    if updates:
-        cur.executemany('UPDATE dividends SET shares=? WHERE id=?', updates)
-        db.commit()
-
-    return share_map
+def fetch_dividends_for_asset(asset: str, td_candidates=None):
+    """Try Twelve Data symbol candidates in turn until one returns dividends.
 
-def fetch_dividends_for_asset(asset: str):
+    Pass ``td_candidates`` when calling outside an app context (worker threads),
+    since resolving them reads the symbol mappings table.
+    """
     records: list[dict] = []
 
-    td_candidates = build_twelvedata_candidates(asset)
+    if td_candidates is None:
+        td_candidates = build_twelvedata_candidates(asset)
     LOGGER.debug("Twelve Data candidates for %s: %s", asset, td_candidates)
     td_errors = []
     for symbol in td_candidates:
@@ -175,83 +96,176 @@ def fetch_dividends_for_asset(asset: str):
     LOGGER.info("Total dividend records fetched for %s: %d", asset, len(records))
     return records
 
-def upsert_dividend(record):
+UPSERT_COLUMNS = ("pay_date", "amount", "currency", "shares", "gross_value", "net_value", "status", "notes")
+
+
+def _dividend_row(record):
+    """Return ``(key, values)`` for a record in ``dividends`` column form, or None without an ex-date."""
     if not record.get("ex_date"):
-        return
-    db = get_db()
-    cur = db.cursor()
-    net_per_share = record["amount"] * (1 - TAX_RATE)
-    status = record.get('status', 'synced')
+        return None
     shares_value = record.get('shares')
     if shares_value is not None:
         try:
             shares_value = float(shares_value)
         except (TypeError, ValueError):
             shares_value = None
-    notes = record.get('notes')
-    cur.execute(
-        """
-        INSERT INTO dividends (asset, ex_date, pay_date, amount, currency, shares, gross_value, net_value, source, status, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(asset, ex_date, source) DO UPDATE SET
-            pay_date=excluded.pay_date,
-            amount=excluded.amount,
-            currency=excluded.currency,
-            shares=CASE WHEN excluded.shares IS NOT NULL THEN excluded.shares ELSE dividends.shares END,
-            gross_value=excluded.gross_value,
-            net_value=excluded.net_value,
-            source=excluded.source,
-            status=excluded.status,
-            notes=CASE WHEN excluded.notes IS NOT NULL THEN excluded.notes ELSE dividends.notes END
+    key = (record["asset"], record["ex_date"], record.get("source", "api"))
+    values = {
+        "pay_date": record.get("pay_date"),
+        "amount": record["amount"],
+        "currency": record.get("currency", "USD"),
+        "shares": shares_value,
+        "gross_value": record["amount"],
+        "net_value": record["amount"] * (1 - TAX_RATE),
+        "status": record.get('status', 'synced'),
+        "notes": record.get('notes'),
+    }
+    return key, values
+
+
+def upsert_dividends(records):
+    """Write ``records`` with one ``executemany`` in a single transaction.
+
+    Rows that already hold the same values are skipped. Returns
+    ``{"inserted", "updated", "unchanged"}`` counts.
+    """
+    rows = {}
+    for record in records:
+        row = _dividend_row(record)
+        if row is not None:
+            rows[row[0]] = row[1]
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if not rows:
+        return counts
+
+    db = get_db()
+    assets = sorted({asset for asset, _, _ in rows})
+    placeholders = ",".join("?" for _ in assets)
+    cur = db.execute(
+        f"""
+        SELECT asset, ex_date, source, {", ".join(UPSERT_COLUMNS)}
+        FROM dividends WHERE asset IN ({placeholders})
         """,
-        (
-            record["asset"],
-            record["ex_date"],
-            record.get("pay_date"),
-            record["amount"],
-            record.get("currency", "USD"),
-            shares_value,
-            record["amount"],
-            net_per_share,
-            record.get("source", "api"),
-            status,
-            notes,
-        ),
+        assets,
     )
-    db.commit()
+    existing = {
+        (row["asset"], row["ex_date"], row["source"]): {column: row[column] for column in UPSERT_COLUMNS}
+        for row in cur.fetchall()
+    }
+
+    changed = []
+    for key, values in rows.items():
+        current = existing.get(key)
+        if current is None:
+            counts["inserted"] += 1
+        else:
+            # NULL shares/notes keep the stored value, mirroring the upsert below
+            merged = dict(values)
+            if merged["shares"] is None:
+                merged["shares"] = current["shares"]
+            if merged["notes"] is None:
+                merged["notes"] = current["notes"]
+            if merged == current:
+                counts["unchanged"] += 1
+                continue
+            counts["updated"] += 1
+        changed.append((*key, *(values[column] for column in UPSERT_COLUMNS)))
+
+    if changed:
+        with db:
+            db.executemany(
+                """
+                INSERT INTO dividends (asset, ex_date, source, pay_date, amount, currency, shares, gross_value, net_value, status, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(asset, ex_date, source) DO UPDATE SET
+                    pay_date=excluded.pay_date,
+                    amount=excluded.amount,
+                    currency=excluded.currency,
+                    shares=CASE WHEN excluded.shares IS NOT NULL THEN excluded.shares ELSE dividends.shares END,
+                    gross_value=excluded.gross_value,
+                    net_value=excluded.net_value,
+                    status=excluded.status,
+                    notes=CASE WHEN excluded.notes IS NOT NULL THEN excluded.notes ELSE dividends.notes END
+                """,
+                changed,
+            )
+            reconcile_dividend_shares(db, {asset for asset, _, _ in rows})
+    return counts
+
+
+def upsert_dividend(record):
+    return upsert_dividends([record])
+
+def _report_progress(progress):
+    CACHE.set("dividends:progress", progress, ttl=DIVIDEND_TTL)
+
 
 def refresh_dividends(force=False):
+    """Fetch dividends for every portfolio asset on a worker pool.
+
+    Requests are paced by the Twelve Data per-minute budget shared across
+    threads, so the pool keeps the quota saturated without exceeding it.
+    Progress is published under ``dividends:progress``; it always ends with
+    ``running`` False, plus an ``error`` message if the run failed.
+    """
     last_sync = CACHE.get("dividends:last_sync", DIVIDEND_TTL)
     cached_result = CACHE.get("dividends:last_result", DIVIDEND_TTL) or {"processed": 0, "missing": []}
     if last_sync and not force:
         LOGGER.debug("Dividends refresh skipped (cached)")
         return cached_result
+    if not _REFRESH_LOCK.acquire(blocking=False):
+        LOGGER.info("Dividends refresh already running")
+        return cached_result
 
-    assets = get_portfolio_assets()
-    result = {"processed": 0, "missing": []}
-    LOGGER.info("Refreshing dividends for %d assets (force=%s)", len(assets), force)
-
-    for asset in assets:
-        fetched = fetch_dividends_for_asset(asset)
-        if not fetched:
-            LOGGER.warning("No dividend data returned for %s", asset)
-            result["missing"].append(asset)
-            continue
-        for record in fetched:
-            upsert_dividend(record)
-            result["processed"] += 1
-
-    if result["missing"]:
-        seen = []
-        for symbol in result["missing"]:
-            if symbol not in seen:
-                seen.append(symbol)
-        result["missing"] = seen
-
-    CACHE.set("dividends:last_sync", time.time())
-    CACHE.set("dividends:last_result", result)
-    LOGGER.info("Dividend refresh completed: %s", result)
-    return result
+    progress = {"total": 0, "done": 0, "running": True, "started_at": time.time()}
+    try:
+        assets = get_portfolio_assets()
+        candidates = {asset: build_twelvedata_candidates(asset) for asset in assets}
+        result = {"processed": 0, "missing": [], "inserted": 0, "updated": 0, "unchanged": 0}
+        records = []
+        progress["total"] = len(assets)
+        _report_progress(progress)
+        LOGGER.info("Refreshing dividends for %d assets (force=%s)", len(assets), force)
+
+        with ThreadPoolExecutor(max_workers=max(1, DIVIDEND_WORKERS)) as pool:
+            futures = {
+                pool.submit(fetch_dividends_for_asset, asset, candidates[asset]): asset
+                for asset in assets
+            }
+            for future in as_completed(futures):
+                asset = futures[future]
+                try:
+                    fetched = future.result()
+                except Exception as exc:
+                    LOGGER.warning("Dividend fetch failed for %s: %s", asset, exc)
+                    fetched = []
+                if not fetched:
+                    LOGGER.warning("No dividend data returned for %s", asset)
+                    result["missing"].append(asset)
+                records.extend(fetched)
+                result["processed"] += len(fetched)
+                progress["done"] += 1
+                _report_progress(progress)
+                LOGGER.info("Dividend refresh progress: %d/%d (%s)", progress["done"], progress["total"], asset)
+
+        result.update(upsert_dividends(records))
+        missing = set(result["missing"])
+        result["missing"] = [asset for asset in assets if asset in missing]
+
+        CACHE.set("dividends:last_sync", time.time(), ttl=DIVIDEND_TTL)
+        CACHE.set("dividends:last_result", result, ttl=DIVIDEND_TTL)
+        LOGGER.info("Dividend refresh completed: %s", result)
+        return result
+    except Exception as exc:
+        progress["error"] = str(exc)
+        raise
+    finally:
+        # Otherwise the page would show a frozen "running" state for DIVIDEND_TTL
+        try:
+            progress.update(running=False, finished_at=time.time())
+            _report_progress(progress)
+        finally:
+            _REFRESH_LOCK.release()
 
 def load_dividends():
     db = get_db()
@@ -267,7 +281,6 @@ def load_dividends():
     return rows
 
 def enrich_with_market_data(dividends):
-    share_map = _sync_dividend_shares(dividends)
     assets = {row['asset'] for row in dividends}
     price_map = {}
     if assets:
@@ -290,9 +303,7 @@ def enrich_with_market_data(dividends):
             pay_date_obj = None
 
         net_per_share = row['net_value'] if row['net_value'] else row['amount'] * (1 - TAX_RATE)
-        shares = share_map.get(row['id'])
-        if shares is None:
-            shares = row['shares'] or 0.0
+        shares = row['shares'] or 0.0
         total_net = net_per_share * shares if shares else None
         price = price_map.get(row["asset"]) if price_map else None
         yield_pct = (row["amount"] / price * 100) if price else None
@@ -318,6 +329,9 @@ def enrich_with_market_data(dividends):
 
 @dividends_bp.route("/", methods=["GET"])
 def list_dividends():
+    db = get_db()
+    if ensure_dividend_shares(db) is not None:
+        db.commit()
     dividends = enrich_with_market_data(load_dividends())
     today = date.today()
     upcoming = [d for d in dividends if d["upcoming"]]
@@ -335,6 +349,39 @@ def list_dividends():
         tax_rate=TAX_RATE,
     )
 
+@dividends_bp.route("/refresh", methods=["POST"])
+def start_refresh():
+    if _REFRESH_LOCK.locked():
+        flash("Dividend refresh is already running.", "info")
+        return redirect(url_for("dividends.list_dividends"))
+
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            refresh_dividends(force=True)
+
+    threading.Thread(target=run, name="dividend-refresh", daemon=True).start()
+    flash("Dividend refresh started.", "success")
+    return redirect(url_for("dividends.list_dividends"))
+
+
+@dividends_bp.route("/refresh-status", methods=["GET"])
+def refresh_status():
+    return jsonify({
+        "progress": CACHE.get("dividends:progress", DIVIDEND_TTL),
+        "last_result": CACHE.get("dividends:last_result", DIVIDEND_TTL),
+    })
+
+@dividends_bp.route("/export", methods=["GET"])
+def export_dividends():
+    # Rowid order needs no sort, so nothing is buffered however many rows there are
+    fmt = parse_export_format(request.args)
+    if fmt is None:
+        return jsonify({"error": "Format must be csv or jsonl"}), 400
+    rows = query_rows(f"SELECT {', '.join(DIVIDEND_COLUMNS)} FROM dividends ORDER BY id")
+    return export_response("dividends", fmt, DIVIDEND_COLUMNS, rows)
+
 @dividends_bp.route("/manual", methods=["GET", "POST"])
 def add_manual_dividend():
     def _value(name: str, default: str = "") -> str:
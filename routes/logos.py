@@ -0,0 +1,17 @@
+from flask import Blueprint, send_from_directory
+
+from logo_store import LOGO_DIR, LOGO_MAX_AGE
+
+logos_bp = Blueprint("logos", __name__)
+
+
+@logos_bp.route('/<path:filename>')
+def logo_file(filename):
+    """Serve a mirrored logo; names are content hashes, so browsers may cache them for good."""
+    response = send_from_directory(LOGO_DIR, filename, max_age=LOGO_MAX_AGE)
+    response.cache_control.immutable = True
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    if filename.endswith('.svg'):
+        # Opened directly, an SVG is a document on our origin; never let it run script
+        response.headers['Content-Security-Policy'] = "sandbox; default-src 'none'; style-src 'unsafe-inline'"
+    return response
@@ -4,8 +4,9 @@ from datetime import datetime
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 
-from db import get_db
-from services.twelvedata import search_symbols
+from db import get_db, bump_data_version
+from services.twelvedata import INTERACTIVE_WAIT, search_symbols
+from symbol_utils import invalidate_symbol_mappings
 
 settings_bp = Blueprint("settings", __name__, url_prefix="/settings")
 
@@ -57,7 +58,9 @@ def mappings():
                         """,
                         (internal_symbol, provider, provider_symbol, priority, notes, now),
                     )
+                    bump_data_version(db, "symbol_mappings")
                     db.commit()
+                    invalidate_symbol_mappings()
                     flash("Alias symbolu zapisany.", "success")
                 except Exception as exc:  # pragma: no cover
                     db.rollback()
@@ -81,7 +84,9 @@ def mappings():
                         "UPDATE symbol_mappings SET active = ?, updated_at = ? WHERE id = ?",
                         (new_state, now, mapping_id_int),
                     )
+                    bump_data_version(db, "symbol_mappings")
                     db.commit()
+                    invalidate_symbol_mappings()
                     flash("Alias został {}.".format("wyłączony" if new_state == 0 else "włączony"), "info")
             return redirect(url_for("settings.mappings"))
 
@@ -93,7 +98,9 @@ def mappings():
                 flash("Nieprawidłowe ID aliasu.", "danger")
             else:
                 cur.execute("DELETE FROM symbol_mappings WHERE id = ?", (mapping_id_int,))
+                bump_data_version(db, "symbol_mappings")
                 db.commit()
+                invalidate_symbol_mappings()
                 flash("Alias został usunięty.", "info")
             return redirect(url_for("settings.mappings"))
 
@@ -106,7 +113,7 @@ def mappings():
                 flash("Podaj zapytanie do wyszukania.", "warning")
             else:
                 try:
-                    search_results = search_symbols(query)
+                    search_results = search_symbols(query, max_wait=INTERACTIVE_WAIT)
                 except Exception as exc:
                     flash(f"Nie udało się wyszukać symbolu: {exc}", "danger")
                     search_results = []
@@ -1,20 +1,161 @@
-from datetime import date
+import io
+from datetime import date, timedelta
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, jsonify, render_template, request, redirect, url_for, flash
 
-from db import get_db
+from db import get_db, bump_data_version
+from dividend_helpers import reconcile_dividend_shares
+from export_helpers import TRANSACTION_COLUMNS, export_response, parse_export_format, query_rows
+from import_helpers import BROKER_FORMATS, CATEGORIES, CsvImportError, import_transactions
+from position_helpers import record_transaction, replay_assets
+from snapshot_helpers import invalidate_snapshots
 
 
 transactions_bp = Blueprint("transactions", __name__)
 
 
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+TRANSACTION_TYPES = ('buy', 'sell')
+
+
+def _parse_cursor(value):
+    """Parse a ``<date>~<id>`` page cursor; None if missing or malformed."""
+    day, sep, tx_id = (value or '').rpartition('~')
+    if not sep or not day:
+        return None
+    try:
+        return day, int(tx_id)
+    except ValueError:
+        return None
+
+
+def _make_cursor(tx):
+    return f"{tx['date']}~{tx['id']}"
+
+
+def _transaction_filters(args):
+    """Return ``(filters, where, params)`` for the list's query-string filters."""
+    filters = {
+        'asset': (args.get('asset') or '').strip().upper(),
+        'type': (args.get('type') or '').strip().lower(),
+        'category': (args.get('category') or '').strip(),
+        'date_from': (args.get('date_from') or '').strip(),
+        'date_to': (args.get('date_to') or '').strip(),
+    }
+    for key in ('date_from', 'date_to'):
+        if filters[key]:
+            try:
+                date.fromisoformat(filters[key])
+            except ValueError:
+                flash(f"Ignoring invalid date: {filters[key]}", "warning")
+                filters[key] = ''
+    if filters['type'] not in TRANSACTION_TYPES:
+        filters['type'] = ''
+
+    clauses = []
+    params = []
+    if filters['asset']:
+        clauses.append("asset = ?")
+        params.append(filters['asset'])
+    if filters['type']:
+        clauses.append("type = ?")
+        params.append(filters['type'])
+    if filters['category']:
+        clauses.append("category = ?")
+        params.append(filters['category'])
+    if filters['date_from']:
+        clauses.append("date >= ?")
+        params.append(filters['date_from'])
+    if filters['date_to']:
+        # Dates may carry a time part, so compare against the following day
+        clauses.append("date < ?")
+        params.append((date.fromisoformat(filters['date_to']) + timedelta(days=1)).isoformat())
+    return filters, clauses, params
+
+
 @transactions_bp.route('/')
 def all_transactions():
+    """Newest-first transaction list with keyset pagination.
+
+    ``before``/``after`` cursors hold the (date, id) of the last/first row
+    shown, so each page is an index range scan on ``(date, id)`` (or
+    ``(asset, date)`` when filtering by asset) however deep it is.
+    """
     db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT * FROM transactions ORDER BY date DESC, id DESC")
-    transactions = cur.fetchall()
-    return render_template('transactions.html', transactions=transactions)
+    filters, clauses, params = _transaction_filters(request.args)
+    try:
+        per_page = int(request.args.get('per_page', PAGE_SIZE))
+    except ValueError:
+        per_page = PAGE_SIZE
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+
+    before = _parse_cursor(request.args.get('before'))
+    after = None if before else _parse_cursor(request.args.get('after'))
+    order = "DESC"
+    if before:
+        clauses.append("(date, id) < (?, ?)")
+        params.extend(before)
+    elif after:
+        clauses.append("(date, id) > (?, ?)")
+        params.extend(after)
+        order = "ASC"
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = db.execute(
+        f"SELECT * FROM transactions {where} ORDER BY date {order}, id {order} LIMIT ?",
+        (*params, per_page + 1),
+    ).fetchall()
+    has_more = len(rows) > per_page
+    transactions = rows[:per_page]
+    if after:
+        transactions.reverse()
+
+    page_args = {key: value for key, value in filters.items() if value}
+    export_url = url_for('transactions.export_transactions', **page_args)
+    if per_page != PAGE_SIZE:
+        page_args['per_page'] = per_page
+    newer_url = older_url = None
+    if transactions:
+        if (after and has_more) or before:
+            newer_url = url_for(
+                'transactions.all_transactions', after=_make_cursor(transactions[0]), **page_args
+            )
+        if (not after and has_more) or after:
+            older_url = url_for(
+                'transactions.all_transactions', before=_make_cursor(transactions[-1]), **page_args
+            )
+
+    # The forms and the importer only write these, so no table scan to list them
+    categories = list(CATEGORIES)
+    if filters['category'] and filters['category'] not in categories:
+        categories.append(filters['category'])
+    return render_template(
+        'transactions.html',
+        transactions=transactions,
+        filters=filters,
+        categories=categories,
+        transaction_types=TRANSACTION_TYPES,
+        per_page=per_page,
+        newer_url=newer_url,
+        older_url=older_url,
+        export_url=export_url,
+    )
+
+
+@transactions_bp.route('/export')
+def export_transactions():
+    """Stream the ledger oldest-first as CSV or JSON lines, honouring the list's filters."""
+    fmt = parse_export_format(request.args)
+    if fmt is None:
+        return jsonify({"error": "Format must be csv or jsonl"}), 400
+    _, clauses, params = _transaction_filters(request.args)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = query_rows(
+        f"SELECT {', '.join(TRANSACTION_COLUMNS)} FROM transactions {where} ORDER BY date ASC, id ASC",
+        params,
+    )
+    return export_response("transactions", fmt, TRANSACTION_COLUMNS, rows)
 
 
 @transactions_bp.route('/add', methods=['GET', 'POST'])
@@ -53,6 +194,22 @@ def add_transaction():
             """,
             (tx_date, asset, tx_type, quantity, price, currency, category),
         )
+        invalidate_snapshots(db, tx_date)
+        bump_data_version(db, "transactions")
+        record_transaction(
+            db,
+            {
+                "id": cur.lastrowid,
+                "date": tx_date,
+                "asset": asset,
+                "category": category,
+                "type": tx_type,
+                "quantity": quantity,
+                "price": price,
+                "currency": currency,
+            },
+        )
+        reconcile_dividend_shares(db, [asset])
         db.commit()
         flash("Transaction added!", "success")
         return redirect(url_for('transactions.all_transactions'))
@@ -104,8 +261,53 @@ def edit_transaction(tx_id):
             """,
             (tx_date, asset, tx_type, quantity, price, currency, category, tx_id),
         )
+        invalidate_snapshots(db, min(str(tx["date"])[:10], tx_date[:10]))
+        bump_data_version(db, "transactions")
+        replay_assets(db, [tx["asset"], asset])
+        reconcile_dividend_shares(db, [tx["asset"], asset])
         db.commit()
         flash("Transaction updated!", "success")
         return redirect(url_for('transactions.all_transactions'))
 
     return render_template('edit.html', tx=tx)
+
+
+@transactions_bp.route('/import', methods=['GET', 'POST'])
+def import_csv():
+    """Bulk import a broker CSV export; the upload is streamed, never read whole."""
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        broker = request.form.get('broker', '')
+        dry_run = bool(request.form.get('dry_run'))
+        if not upload or not upload.filename:
+            flash("Choose a CSV file to import.", "danger")
+            return redirect(url_for('transactions.import_csv'))
+        fmt = BROKER_FORMATS.get(broker)
+        if fmt is None:
+            flash("Unknown broker format.", "danger")
+            return redirect(url_for('transactions.import_csv'))
+
+        encoding = request.form.get('encoding') or fmt.encoding
+        lines = io.TextIOWrapper(upload.stream, encoding=encoding, newline='')
+        try:
+            report = import_transactions(get_db(), lines, broker, dry_run=dry_run)
+        except CsvImportError as exc:
+            flash(str(exc), "danger")
+            return redirect(url_for('transactions.import_csv'))
+        except (UnicodeDecodeError, LookupError):
+            flash(f"The file is not valid {encoding} text; pick another encoding.", "danger")
+            return redirect(url_for('transactions.import_csv'))
+
+        verb = "Would import" if dry_run else "Imported"
+        flash(
+            f"{verb} {report['imported']} of {report['read']} rows across {report['assets']} assets; "
+            f"{report['duplicates']} duplicates skipped, {report['invalid']} invalid.",
+            "info" if dry_run else "success",
+        )
+        for line_no, message in report['errors']:
+            flash(f"Line {line_no}: {message}", "warning")
+        if dry_run or report['invalid']:
+            return redirect(url_for('transactions.import_csv'))
+        return redirect(url_for('transactions.all_transactions'))
+
+    return render_template('import.html', broker_formats=BROKER_FORMATS)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of CacheStore.get/set per-call latency.
+
+Compares the previous connect-per-call implementation with the current
+store (persistent connections, WAL and the in-process LRU tier) on a
+throwaway database, so portfolio.db is never touched.
+"""
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_store import CacheStore  # noqa: E402
+
+KEYS = 200
+ROUNDS = 10
+PAYLOAD = {"price": 123.45, "currency": "USD", "raw_currency": "USD", "cache_version": 2}
+
+
+class LegacyCacheStore:
+    """Connect-per-call store, as it was before pooled connections."""
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS api_cache (key TEXT PRIMARY KEY, value TEXT, timestamp REAL)"
+            )
+
+    def get(self, key, max_age_seconds):
+        with sqlite3.connect(self.db_path) as conn:
+            row = conn.execute("SELECT value, timestamp FROM api_cache WHERE key = ?", (key,)).fetchone()
+        if not row or time.time() - row[1] > max_age_seconds:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO api_cache (key, value, timestamp) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+
+
+def _per_call_us(func, calls):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def run(store):
+    keys = [f"price:SYM{i}" for i in range(KEYS)]
+
+    def writes():
+        for key in keys:
+            store.set(key, PAYLOAD)
+
+    def reads():
+        for _ in range(ROUNDS):
+            for key in keys:
+                store.get(key, 600)
+
+    return _per_call_us(writes, KEYS), _per_call_us(reads, KEYS * ROUNDS)
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {
+            "legacy (connect per call)": run(LegacyCacheStore(Path(tmp) / "legacy.db")),
+            "pooled + WAL, no hot tier": run(CacheStore(Path(tmp) / "pooled.db", hot_items=0)),
+            "pooled + WAL + hot tier": run(CacheStore(Path(tmp) / "hot.db")),
+        }
+    print(f"{'store':<28}{'set (us/call)':>16}{'get (us/call)':>16}")
+    for name, (set_us, get_us) in results.items():
+        print(f"{name:<28}{set_us:>16.1f}{get_us:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
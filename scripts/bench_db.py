@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark dashboard and transaction-list queries on a large synthetic database.
+
+Builds two throwaway copies of the same data: "legacy" has only the base
+schema (migration 1) and default connection settings, "tuned" has every
+migration applied and is queried through ``db.connect`` with ``DB_PRAGMAS``.
+portfolio.db is never touched.
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import MIGRATIONS, connect, migrate  # noqa: E402
+
+ASSETS = [f"SYM{i:03d}" for i in range(300)]
+CATEGORIES = ["Equity", "ETF", "REIT"]
+START = date(2005, 1, 1)
+
+
+def _populate(conn, transactions, seed=7):
+    rng = random.Random(seed)
+    days = (date.today() - START).days
+    conn.executemany(
+        "INSERT INTO transactions (date, asset, type, quantity, price, currency, category) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            (
+                (START + timedelta(days=rng.randrange(days))).isoformat(),
+                rng.choice(ASSETS),
+                "buy" if rng.random() < 0.7 else "sell",
+                rng.randint(1, 100),
+                round(rng.uniform(5, 500), 2),
+                "USD",
+                rng.choice(CATEGORIES),
+            )
+            for _ in range(transactions)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO cash_deposits (created_at, amount, delta, note) VALUES (?, ?, ?, ?)",
+        (((START + timedelta(days=i)).isoformat(), 1000.0 + i, 1.0, None) for i in range(days)),
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO dividends (asset, ex_date, pay_date, amount, source) VALUES (?, ?, ?, ?, ?)",
+        (
+            (asset, (START + timedelta(days=90 * q)).isoformat(), (START + timedelta(days=90 * q + 14)).isoformat(), 0.5, "bench")
+            for asset in ASSETS
+            for q in range(days // 90)
+        ),
+    )
+    conn.commit()
+
+
+def _build(path, transactions, tuned):
+    """Create the schema and data; return an open connection configured for the variant."""
+    if tuned:
+        conn = connect(path)
+        migrate(conn)
+    else:
+        conn = sqlite3.connect(path)
+        conn.isolation_level = None
+        conn.execute("BEGIN")
+        MIGRATIONS[0](conn.cursor())
+        conn.execute("COMMIT")
+        conn.isolation_level = ""
+    _populate(conn, transactions)
+    conn.execute("ANALYZE")
+    return conn
+
+
+def _queries(conn):
+    middle = conn.execute(
+        "SELECT date, id FROM transactions ORDER BY date DESC, id DESC LIMIT 1 OFFSET ?",
+        (conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] // 2,),
+    ).fetchone()
+    return {
+        "dashboard: latest cash": ("SELECT amount FROM cash_deposits ORDER BY created_at DESC LIMIT 1", ()),
+        "dashboard: bonds": ("SELECT * FROM bonds ORDER BY purchase_date DESC, id DESC", ()),
+        "dashboard: ledger replay": (
+            "SELECT id, date, asset, category, type, quantity, price, currency FROM transactions ORDER BY date ASC, id ASC",
+            (),
+        ),
+        "transactions: first page": ("SELECT * FROM transactions ORDER BY date DESC, id DESC LIMIT 51", ()),
+        "transactions: middle page": (
+            "SELECT * FROM transactions WHERE (date, id) < (?, ?) ORDER BY date DESC, id DESC LIMIT 51",
+            tuple(middle),
+        ),
+        "transactions: asset filter": (
+            "SELECT * FROM transactions WHERE asset = ? ORDER BY date DESC, id DESC LIMIT 51",
+            (ASSETS[42],),
+        ),
+        "transactions: asset ledger": (
+            "SELECT asset, date, type, quantity FROM transactions WHERE asset IN (?, ?) ORDER BY date ASC, id ASC",
+            (ASSETS[1], ASSETS[2]),
+        ),
+    }
+
+
+def _time_ms(conn, sql, params, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transactions", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Building {args.transactions} transactions twice...")
+        legacy = _build(Path(tmp) / "legacy.db", args.transactions, tuned=False)
+        tuned = _build(Path(tmp) / "tuned.db", args.transactions, tuned=True)
+
+        print(f"{'query':<28} {'legacy ms':>10} {'tuned ms':>10} {'speed-up':>9}")
+        for name, (sql, params) in _queries(legacy).items():
+            before = _time_ms(legacy, sql, params, args.rounds)
+            after = _time_ms(tuned, sql, params, args.rounds)
+            print(f"{name:<28} {before:>10.3f} {after:>10.3f} {before / after:>8.1f}x")
+        legacy.close()
+        tuned.close()
+
+
+if __name__ == "__main__":
+    main()
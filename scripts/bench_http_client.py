@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of per-call latency for provider HTTP requests.
+
+Compares the previous module-level ``requests.get`` (a new connection per
+call) with ``services.http_client.get`` (pooled keep-alive sessions) against
+a local stub server. Real providers are reached over TLS across the
+internet, so the stub can delay every new connection by ``--handshake-ms``
+to stand in for the TCP+TLS round trips a reused connection skips.
+"""
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services import http_client  # noqa: E402
+
+PAYLOAD = json.dumps({"symbol": "AAPL", "price": 123.45, "currency": "USD"}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open between requests
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    handshake_delay = 0.0
+    connections = 0
+
+    def get_request(self):
+        request = super().get_request()
+        self.connections += 1
+        time.sleep(self.handshake_delay)
+        return request
+
+
+def _latencies_ms(fetch, url, calls):
+    samples = []
+    for i in range(calls):
+        start = time.perf_counter()
+        response = fetch(url, params={"symbol": f"SYM{i}"})
+        response.raise_for_status()
+        response.json()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _legacy_get(url, params=None):
+    return requests.get(url, params=params, timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, nargs="+", default=[0.0, 20.0])
+    args = parser.parse_args()
+
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/quote"
+
+    print(f"{'handshake':>10} {'client':>8} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'conns':>6}")
+    for handshake_ms in args.handshake_ms:
+        server.handshake_delay = handshake_ms / 1000
+        results = {}
+        for name, fetch in (("legacy", _legacy_get), ("pooled", http_client.get)):
+            http_client.close_all()
+            server.connections = 0
+            samples = _latencies_ms(fetch, url, args.calls)
+            results[name] = statistics.mean(samples)
+            p95 = statistics.quantiles(samples, n=20)[-1]
+            print(
+                f"{handshake_ms:>8.0f}ms {name:>8} {results[name]:>9.3f} "
+                f"{statistics.median(samples):>8.3f} {p95:>8.3f} {server.connections:>6}"
+            )
+        print(f"{'':>10} saved {results['legacy'] - results['pooled']:.3f} ms per call "
+              f"({results['legacy'] / results['pooled']:.1f}x)")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Benchmark helpers.build_profit_timeseries against the previous day-by-day loop.
+
+Builds a synthetic ledger (default: 15 years, 80 assets) with deterministic
+price histories, checks that both implementations return identical series
+and prints their timings. No network access is needed: price histories are
+generated in-process instead of being fetched from Yahoo.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+
+import helpers  # noqa: E402
+from helpers import PENCE_TICKERS, _normalize_currency, build_profit_timeseries  # noqa: E402
+
+
+# symbol -> sorted (day, close) tuples, the shape the legacy loop read prices in
+LEGACY_HISTORIES = {}
+
+
+def legacy_build_profit_timeseries(transactions, asset_fx_rates, current_price_map=None):
+    """The per-day, per-asset loop that build_profit_timeseries replaced."""
+    parsed = []
+    assets = set()
+    for tx in transactions:
+        asset = tx["asset"]
+        parsed.append(
+            {
+                "id": tx["id"],
+                "date": date.fromisoformat(tx["date"]),
+                "asset": asset,
+                "currency": _normalize_currency(tx["currency"]),
+                "type": tx["type"],
+                "quantity": tx["quantity"],
+                "price": tx["price"],
+            }
+        )
+        assets.add(asset)
+
+    parsed.sort(key=lambda item: (item["date"], item["id"]))
+    start_date = parsed[0]["date"]
+    end_date = max(parsed[-1]["date"], date.today())
+
+    price_histories = {}
+    for asset in assets:
+        series = LEGACY_HISTORIES.get(asset, [])
+        if asset in PENCE_TICKERS:
+            series = [(day, price / 100.0) for day, price in series]
+        price_histories[asset] = series
+    price_indexes = {asset: 0 for asset in assets}
+    last_price = {asset: None for asset in assets}
+
+    positions = {asset: {"qty": 0.0, "cost_local": 0.0, "cost_pln": 0.0} for asset in assets}
+    realized_profit_pln = 0.0
+
+    profit_series = []
+    tx_index = 0
+    day = start_date
+    while day <= end_date:
+        while tx_index < len(parsed) and parsed[tx_index]["date"] <= day:
+            tx = parsed[tx_index]
+            asset = tx["asset"]
+            fx_rate = asset_fx_rates.get(asset, 1.0)
+            record = positions[asset]
+            quantity = tx["quantity"]
+            price = tx["price"]
+            if tx["type"] == "buy":
+                record["qty"] += quantity
+                record["cost_local"] += quantity * price
+                record["cost_pln"] += quantity * price * fx_rate
+            elif tx["type"] == "sell":
+                available_qty = record["qty"]
+                if available_qty > 0:
+                    sell_qty = min(quantity, available_qty)
+                    avg_cost_local = record["cost_local"] / available_qty
+                    avg_cost_pln = record["cost_pln"] / available_qty
+                    record["qty"] -= sell_qty
+                    record["cost_local"] -= sell_qty * avg_cost_local
+                    record["cost_pln"] -= sell_qty * avg_cost_pln
+                    realized_profit_pln += sell_qty * price * fx_rate - sell_qty * avg_cost_pln
+                    if abs(record["cost_local"]) < 1e-8:
+                        record["cost_local"] = 0.0
+                    if abs(record["cost_pln"]) < 1e-8:
+                        record["cost_pln"] = 0.0
+            tx_index += 1
+
+        unrealized_pln = 0.0
+        for asset, record in positions.items():
+            qty = record["qty"]
+            if qty <= 0:
+                continue
+            series = price_histories.get(asset, [])
+            idx = price_indexes.get(asset, 0)
+            while idx < len(series) and series[idx][0] <= day:
+                last_price[asset] = series[idx][1]
+                idx += 1
+            price_indexes[asset] = idx
+            price_local = last_price.get(asset)
+            if price_local is None and current_price_map:
+                price_local = current_price_map.get(asset)
+            if price_local is None:
+                continue
+            unrealized_pln += qty * price_local * asset_fx_rates.get(asset, 1.0) - record["cost_pln"]
+        profit_series.append({"date": day.isoformat(), "value": round(realized_profit_pln + unrealized_pln, 2)})
+        day += timedelta(days=1)
+
+    return profit_series
+
+
+def synthetic_portfolio(years, n_assets, seed=7):
+    rng = random.Random(seed)
+    today = date.today()
+    start = today - timedelta(days=365 * years)
+    assets = [f"SYM{i}" for i in range(n_assets)] + ["NWG.L"]
+    histories = {}
+    transactions = []
+    for asset in assets:
+        first_quote = start + timedelta(days=rng.randint(0, 365))
+        price = rng.uniform(5, 500)
+        series = []
+        day = first_quote
+        while day <= today:
+            if day.weekday() < 5:
+                price = max(0.5, price * (1 + rng.gauss(0, 0.015)))
+                series.append((day, price))
+            day += timedelta(days=1)
+        histories[asset] = series
+
+        held = 0.0
+        for _ in range(rng.randint(4, 40)):
+            tx_day = start + timedelta(days=rng.randint(0, 365 * years))
+            if held > 0 and rng.random() < 0.3:
+                qty = round(rng.uniform(0.1, 1.2) * held, 4)
+                tx_type = "sell"
+            else:
+                qty = float(rng.randint(1, 50))
+                tx_type = "buy"
+            held = max(0.0, held + (qty if tx_type == "buy" else -qty))
+            transactions.append(
+                {
+                    "id": len(transactions) + 1,
+                    "date": tx_day.isoformat(),
+                    "asset": asset,
+                    "type": tx_type,
+                    "quantity": qty,
+                    "price": round(rng.uniform(5, 500), 2),
+                    "currency": rng.choice(["PLN", "USD", "EUR"]),
+                }
+            )
+    fx_rates = {asset: rng.choice([1.0, 3.98, 4.31]) for asset in assets}
+    current = {asset: rng.uniform(5, 500) for asset in assets}
+    return transactions, histories, fx_rates, current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--years", type=int, default=15)
+    parser.add_argument("--assets", type=int, default=80)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    transactions, histories, fx_rates, current = synthetic_portfolio(args.years, args.assets)
+    LEGACY_HISTORIES.update(histories)
+    # The store hands out (day ordinals, closes) arrays converted by SQLite
+    arrays = {
+        symbol: (
+            np.array([day.toordinal() for day, _ in series], dtype=np.int64),
+            np.array([close for _, close in series], dtype=float),
+        )
+        for symbol, series in histories.items()
+    }
+
+    def fake_price_history(symbol, start_date, end_date, read_from=None):
+        days, closes = arrays[symbol]
+        if read_from and read_from > start_date:
+            first = max(np.searchsorted(days, read_from.toordinal()) - 1, 0)
+            return days[first:], closes[first:]
+        return days, closes
+
+    helpers._get_price_history = fake_price_history
+    # No synthetic symbol has a sync state, as on a fresh database
+    helpers.PRICE_HISTORY.sync_states = lambda symbols: {}
+
+    timings = {}
+    results = {}
+    for name, func in (("legacy loop", legacy_build_profit_timeseries), ("vectorised", build_profit_timeseries)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            results[name] = func(transactions, fx_rates, current)
+            best = min(best, time.perf_counter() - started)
+        timings[name] = best
+
+    identical = results["legacy loop"] == results["vectorised"]
+    print(
+        f"{len(transactions)} transactions, {args.assets + 1} assets, "
+        f"{len(results['vectorised'])} days; outputs identical: {identical}"
+    )
+    for name, seconds in timings.items():
+        print(f"{name:<12}{seconds * 1000:>10.1f} ms")
+    print(f"speed-up    {timings['legacy loop'] / timings['vectorised']:>10.1f}x")
+    if not identical:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
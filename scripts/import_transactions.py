@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Import a broker CSV export into portfolio.db from the command line.
+
+Same pipeline as the /transactions/import page: the file is streamed,
+rows are validated and de-duplicated against the ledger, and everything is
+inserted in one transaction together with the position, snapshot and
+dividend updates. Use --dry-run to see the counts without saving.
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import DB_PATH, connect, migrate  # noqa: E402
+from import_helpers import BROKER_FORMATS, CsvImportError, import_transactions  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("csv_path", type=Path)
+    parser.add_argument("--broker", choices=sorted(BROKER_FORMATS), required=True)
+    parser.add_argument("--encoding", help="defaults to the broker's usual export encoding")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    migrate(conn)
+    conn.row_factory = sqlite3.Row
+    encoding = args.encoding or BROKER_FORMATS[args.broker].encoding
+    started = time.perf_counter()
+    try:
+        with open(args.csv_path, encoding=encoding, newline="") as handle:
+            report = import_transactions(conn, handle, args.broker, dry_run=args.dry_run)
+    except (CsvImportError, UnicodeDecodeError) as exc:
+        sys.exit(f"Import failed: {exc}")
+    finally:
+        conn.close()
+
+    verb = "Would import" if args.dry_run else "Imported"
+    print(
+        f"{verb} {report['imported']} of {report['read']} rows across {report['assets']} assets "
+        f"in {time.perf_counter() - started:.2f}s; {report['duplicates']} duplicates skipped, "
+        f"{report['invalid']} invalid."
+    )
+    for line_no, message in report["errors"]:
+        print(f"  line {line_no}: {message}")
+
+
+if __name__ == "__main__":
+    main()
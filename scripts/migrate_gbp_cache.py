@@ -2,6 +2,8 @@
 """
 Clear cached Yahoo Finance price history entries that were stored in GBX (pence)
 so they are repopulated in GBP using the updated logic.
+
+Covers both the legacy ``history:*`` cache keys and the ``price_history`` table.
 """
 from pathlib import Path
 import sqlite3
@@ -30,7 +32,13 @@ def purge_cache_for_asset(conn: sqlite3.Connection, asset: str) -> tuple[int, in
     price_deleted = cur.rowcount
 
     cur.execute("DELETE FROM api_cache WHERE key LIKE ?", (history_pattern,))
-    history_deleted = cur.rowcount
+    history_deleted = cur.rowcount or 0
+
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'price_history'")
+    if cur.fetchone():
+        cur.execute("DELETE FROM price_history WHERE symbol = ?", (asset,))
+        history_deleted += cur.rowcount or 0
+        cur.execute("DELETE FROM price_history_sync WHERE symbol = ?", (asset,))
 
     return price_deleted or 0, history_deleted or 0
 
@@ -59,6 +67,12 @@ def main() -> None:
                     f"and {price_deleted} price entries"
                 )
 
+        if total_price or total_history:
+            # Snapshots were derived from the purged prices; let the dashboard rebuild them
+            cur = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'snapshots'")
+            if cur.fetchone():
+                conn.execute("DELETE FROM snapshots")
+
         conn.commit()
         print(
             f"Done. Removed {total_history} history rows and "
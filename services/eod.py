@@ -1,11 +1,22 @@
 import os
-import requests
 from typing import Optional
 
 from cache_store import CACHE
+from services import http_client
+from services.ratelimit import TokenBucket
 
 EOD_API_KEY = os.getenv("EOD_API_KEY")
 BASE_URL = "https://eodhistoricaldata.com/api"
+CALLS_PER_MINUTE = int(os.getenv("EOD_RPM", 1000))
+CALLS_PER_DAY = int(os.getenv("EOD_DAILY_CALLS", 100000))
+
+# API calls charged per request, keyed by the first path segment
+CREDIT_COSTS = {
+    "dividends": 1,
+    "fundamentals": 10,
+}
+
+RATE_LIMIT = TokenBucket("eod", CALLS_PER_MINUTE, CALLS_PER_DAY)
 
 
 def _request(endpoint: str, params: Optional[dict] = None, cache_ttl: int = 6 * 60 * 60):
@@ -20,10 +31,11 @@ def _request(endpoint: str, params: Optional[dict] = None, cache_ttl: int = 6 *
     if cached:
         return cached
 
-    response = requests.get(f"{BASE_URL}/{endpoint}", params=params, timeout=10)
+    RATE_LIMIT.acquire(CREDIT_COSTS.get(endpoint.split("/")[0], 1))
+    response = http_client.get(f"{BASE_URL}/{endpoint}", params=params)
     response.raise_for_status()
     data = response.json()
-    CACHE.set(cache_key, data)
+    CACHE.set(cache_key, data, ttl=cache_ttl)
     return data
 
 
@@ -0,0 +1,62 @@
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 10))
+POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 10))  # keep-alive connections per host
+RETRIES = int(os.environ.get("HTTP_RETRIES", 3))
+RETRY_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", 0.5))  # 0.5s, 1s, 2s, ...
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_sessions_pid = os.getpid()
+
+
+def _new_session():
+    retry = Retry(
+        total=RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def session_for(url):
+    """Return the shared keep-alive session for ``url``'s host."""
+    global _sessions_pid
+    host = urlsplit(url).netloc.lower()
+    with _sessions_lock:
+        if _sessions_pid != os.getpid():
+            # Sockets inherited from a parent process must not be shared
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+        session = _sessions.get(host)
+        if session is None:
+            session = _sessions[host] = _new_session()
+        return session
+
+
+def get(url, params=None, read_timeout=None, **kwargs):
+    """``requests.get`` over a pooled session, retrying 429/5xx with exponential backoff."""
+    timeout = (CONNECT_TIMEOUT, read_timeout or READ_TIMEOUT)
+    return session_for(url).get(url, params=params, timeout=timeout, **kwargs)
+
+
+def close_all():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
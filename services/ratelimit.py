@@ -0,0 +1,117 @@
+import time
+from datetime import date
+
+from db import DB_PATH, pooled_connection
+
+
+class QuotaExceeded(RuntimeError):
+    """The provider's daily credit allowance is used up."""
+
+
+class RateLimited(RuntimeError):
+    """The credits would not be available within the caller's ``max_wait``."""
+
+
+class TokenBucket:
+    """Per-provider token bucket whose state lives in SQLite.
+
+    The bucket holds up to ``per_minute`` credits and refills continuously;
+    it can run into debt, see ``_take``.
+    ``acquire(cost)`` blocks until enough credits are available, so callers
+    queue instead of hitting the provider's rate limit; request handlers
+    pass ``max_wait`` so they give up rather than sit behind a background
+    job's debt. Because the state is a table row updated under
+    ``BEGIN IMMEDIATE``, every thread and worker process shares one bucket,
+    and the remaining quota and daily usage survive restarts. The daily
+    allowance raises ``QuotaExceeded``.
+    """
+
+    def __init__(self, provider, per_minute, daily_limit=None, db_path=DB_PATH):
+        self.provider = provider
+        self.capacity = max(1, per_minute)
+        self.rate = self.capacity / 60.0
+        self.daily_limit = daily_limit
+        self.db_path = str(db_path)
+
+    def _connection(self):
+        return pooled_connection(self.db_path)
+
+    def _take(self, cost):
+        """Take ``cost`` credits if available; return 0, or the seconds to wait before retrying.
+
+        An endpoint dearer than a full bucket goes out once the bucket is
+        full and leaves it negative, so later callers wait until the debt
+        is repaid and the per-minute rate still holds.
+        """
+        needed = min(cost, self.capacity)
+        conn = self._connection()
+        now = time.time()
+        today = date.today().isoformat()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at, day, used_today FROM provider_quota WHERE provider = ?",
+                (self.provider,),
+            ).fetchone()
+            tokens, updated_at, day, used_today = row or (self.capacity, now, today, 0)
+            tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+            if day != today:
+                day, used_today = today, 0
+            if self.daily_limit and used_today + cost > self.daily_limit:
+                raise QuotaExceeded(
+                    f"{self.provider} daily quota used up ({used_today}/{self.daily_limit} credits)"
+                )
+
+            wait = 0.0
+            if tokens >= needed:
+                tokens -= cost
+                used_today += cost
+            else:
+                wait = (needed - tokens) / self.rate
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO provider_quota (provider, tokens, updated_at, day, used_today)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (self.provider, tokens, now, day, used_today),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, cost=1, max_wait=None):
+        """Take ``cost`` credits, sleeping until the bucket has refilled enough.
+
+        With ``max_wait`` (seconds, 0 to never sleep) raise ``RateLimited``
+        instead, without taking anything, once the credits would not be
+        available in time. Background jobs leave it None and queue.
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        while True:
+            wait = self._take(cost)
+            if wait <= 0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimited(f"{self.provider} rate limit reached, {cost} credits free in {wait:.0f} s")
+            time.sleep(wait)
+
+    def usage(self):
+        row = self._connection().execute(
+            "SELECT tokens, updated_at, day, used_today FROM provider_quota WHERE provider = ?",
+            (self.provider,),
+        ).fetchone()
+        used_today = 0
+        tokens = self.capacity
+        if row:
+            tokens = min(self.capacity, row[0] + max(0.0, time.time() - row[1]) * self.rate)
+            if row[2] == date.today().isoformat():
+                used_today = row[3]
+        return {
+            "provider": self.provider,
+            "used_today": used_today,
+            "daily_limit": self.daily_limit,
+            "available": round(max(0.0, tokens), 1),
+            "per_minute": self.capacity,
+        }
@@ -1,14 +1,34 @@
 import os
-import requests
 from typing import Optional
 
 from cache_store import CACHE
+from services import http_client
+from services.ratelimit import TokenBucket
 
 TWELVE_API_KEY = os.getenv("TWELVE_DATA_API_KEY")
 BASE_URL = "https://api.twelvedata.com"
+CREDITS_PER_MINUTE = int(os.getenv("TWELVE_DATA_RPM", 8))  # free tier allowance
+CREDITS_PER_DAY = int(os.getenv("TWELVE_DATA_DAILY_CREDITS", 800))
+INTERACTIVE_WAIT = float(os.getenv("TWELVE_DATA_INTERACTIVE_WAIT", 2))  # seconds a page request queues for credits
 
+# API credits charged per call; endpoints not listed cost one credit
+CREDIT_COSTS = {
+    "dividends": 20,
+    "fundamentals": 20,
+    "logo": 1,
+    "symbol_search": 1,
+}
 
-def _request(endpoint: str, params: Optional[dict] = None, cache_ttl: int = 6 * 60 * 60):
+# Shared by every thread and process that calls Twelve Data
+RATE_LIMIT = TokenBucket("twelvedata", CREDITS_PER_MINUTE, CREDITS_PER_DAY)
+
+
+def _request(
+    endpoint: str,
+    params: Optional[dict] = None,
+    cache_ttl: int = 6 * 60 * 60,
+    max_wait: Optional[float] = None,
+):
     if not TWELVE_API_KEY:
         raise RuntimeError("TWELVE_DATA_API_KEY not set")
 
@@ -20,13 +40,14 @@ def _request(endpoint: str, params: Optional[dict] = None, cache_ttl: int = 6 *
     if cached is not None:
         return cached
 
-    response = requests.get(f"{BASE_URL}/{endpoint}", params=params, timeout=10)
+    RATE_LIMIT.acquire(CREDIT_COSTS.get(endpoint, 1), max_wait=max_wait)
+    response = http_client.get(f"{BASE_URL}/{endpoint}", params=params)
     response.raise_for_status()
     data = response.json()
     if isinstance(data, dict) and data.get("status") == "error":
         message = data.get("message") or "Twelve Data error"
         raise RuntimeError(message)
-    CACHE.set(cache_key, data)
+    CACHE.set(cache_key, data, ttl=cache_ttl)
     return data
 
 
@@ -37,12 +58,17 @@ def fetch_dividends(symbol: str):
 def fetch_fundamentals(symbol: str):
     return _request("fundamentals", {"symbol": symbol}, cache_ttl=24 * 60 * 60)
 
-def fetch_logo(symbol: str):
-    return _request("logo", {"symbol": symbol}, cache_ttl=7 * 24 * 60 * 60)
+def fetch_logo(symbol: str, max_wait: Optional[float] = None):
+    return _request("logo", {"symbol": symbol}, cache_ttl=7 * 24 * 60 * 60, max_wait=max_wait)
 
 
-def search_symbols(query: str, outputsize: int = 10):
-    data = _request("symbol_search", {"symbol": query, "outputsize": outputsize}, cache_ttl=60 * 60)
+def search_symbols(query: str, outputsize: int = 10, max_wait: Optional[float] = None):
+    data = _request(
+        "symbol_search",
+        {"symbol": query, "outputsize": outputsize},
+        cache_ttl=60 * 60,
+        max_wait=max_wait,
+    )
     if isinstance(data, dict):
         return data.get("data", [])
     return data
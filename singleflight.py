@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+import uuid
+
+from db import DB_PATH, pooled_connection
+LEASES_ENABLED = os.environ.get("SINGLEFLIGHT_LEASES", "0").lower() not in ("0", "false", "no", "off")
+LEASE_SECONDS = float(os.environ.get("SINGLEFLIGHT_LEASE_SECONDS", 30))
+LEASE_POLL = 0.2
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent cache-miss fetches of the same key into one.
+
+    ``do(key, func, recheck)`` runs ``func`` in the first thread that asks for
+    ``key``; threads asking while it runs wait and share its result (or its
+    exception). ``func`` is expected to fill the cache itself, and ``recheck``
+    reads that cache entry back (None on a miss), so a caller arriving just
+    after a fetch finished is served from the cache instead of fetching again.
+
+    With leases enabled the leader also claims a row in ``fetch_leases`` so
+    that other processes wait for it, polling ``recheck``, instead of fetching
+    the same key. A lease left behind by a crashed process expires after
+    ``lease_seconds``.
+    """
+
+    def __init__(self, db_path=DB_PATH, leases=LEASES_ENABLED, lease_seconds=LEASE_SECONDS):
+        self.db_path = str(db_path)
+        self.leases = leases
+        self.lease_seconds = lease_seconds
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        return pooled_connection(self.db_path)
+
+    def _claim(self, key, owner):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            cur = conn.execute(
+                """
+                INSERT INTO fetch_leases (key, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET owner=excluded.owner, expires_at=excluded.expires_at
+                WHERE fetch_leases.expires_at < ?
+                """,
+                (key, owner, now + self.lease_seconds, now),
+            )
+        return cur.rowcount == 1
+
+    def _release(self, key, owner):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM fetch_leases WHERE key = ? AND owner = ?", (key, owner))
+
+    def _lead(self, key, func, recheck):
+        if recheck is not None:
+            value = recheck()
+            if value is not None:
+                return value
+        if not self.leases:
+            return func()
+
+        owner = uuid.uuid4().hex
+        while not self._claim(key, owner):
+            time.sleep(LEASE_POLL)
+            if recheck is not None:
+                value = recheck()
+                if value is not None:
+                    return value
+        try:
+            if recheck is not None:
+                # The previous holder may have filled the cache just before releasing
+                value = recheck()
+                if value is not None:
+                    return value
+            return func()
+        finally:
+            self._release(key, owner)
+
+    def do(self, key, func, recheck=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._lead(key, func, recheck)
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+
+# Create the global singleflight instance
+FLIGHTS = SingleFlight()
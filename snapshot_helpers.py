@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from helpers import compute_profit_components, profit_points
+
+
+def _snapshot_day(value) -> str:
+    return str(value)[:10]
+
+
+def invalidate_snapshots(db, from_date) -> None:
+    """Drop snapshots on or after ``from_date``; the next dashboard load recomputes them."""
+    db.execute("DELETE FROM snapshots WHERE date >= ?", (_snapshot_day(from_date),))
+
+
+def clear_snapshots(db) -> None:
+    db.execute("DELETE FROM snapshots")
+
+
+def load_profit_series(db, transactions, asset_fx_rates=None, current_price_map=None):
+    """Return the daily profit series, computing only the days after the last snapshot.
+
+    Completed days are persisted in ``snapshots`` together with their realized
+    and unrealized P/L and market value. Today is always computed live and
+    never stored, because its prices are still moving. So is every day from
+    the first one not ``priced`` by ``compute_profit_components``: a held
+    asset has no historical close yet, or only one carried forward past its
+    last stored close (tail download pending or failed). Those days are
+    recomputed once the closes arrive instead of being frozen.
+
+    Stored days keep the FX rates in effect when they were written, while
+    new days use the current rates, so the series can step where the two
+    meet. A ledger edit revalues the days from the edited trade on at
+    today's rates, and clearing the caches revalues them all.
+    """
+    tx_days = [_snapshot_day(tx["date"]) for tx in transactions if tx.get("asset") and tx.get("date")]
+    if not tx_days:
+        clear_snapshots(db)
+        db.commit()
+        return []
+
+    today = date.today()
+    cur = db.cursor()
+    cur.execute(
+        "SELECT date, realized_pln, unrealized_pln FROM snapshots WHERE date < ? ORDER BY date",
+        (today.isoformat(),),
+    )
+    rows = cur.fetchall()
+    if rows:
+        first_day = date.fromisoformat(rows[0][0])
+        last_day = date.fromisoformat(rows[-1][0])
+        contiguous = (last_day - first_day).days + 1 == len(rows)
+        if rows[0][0] != min(tx_days) or not contiguous:
+            clear_snapshots(db)
+            rows = []
+
+    from_date = date.fromisoformat(rows[-1][0]) + timedelta(days=1) if rows else None
+    components = compute_profit_components(
+        transactions, asset_fx_rates, current_price_map, from_date=from_date
+    )
+    if components is None:
+        db.commit()
+        return []
+
+    start = components["start"]
+    new_rows = []
+    for offset in range(len(components["realized"])):
+        day = start + timedelta(days=offset)
+        if day >= today or not components["priced"][offset]:
+            break
+        new_rows.append(
+            (
+                day.isoformat(),
+                float(components["market_value"][offset]),
+                float(components["realized"][offset]),
+                float(components["unrealized"][offset]),
+            )
+        )
+    if new_rows:
+        cur.executemany(
+            """
+            INSERT OR REPLACE INTO snapshots (date, total_value_pln, realized_pln, unrealized_pln)
+            VALUES (?, ?, ?, ?)
+            """,
+            new_rows,
+        )
+    db.commit()
+
+    if rows:
+        start = date.fromisoformat(rows[0][0])
+    realized = np.concatenate([[row[1] for row in rows], components["realized"]])
+    unrealized = np.concatenate([[row[2] for row in rows], components["unrealized"]])
+    return profit_points(start, realized, unrealized)
@@ -0,0 +1,232 @@
+import os
+import time
+
+from cache_store import SQL_BATCH_SIZE
+from db import DB_PATH, pooled_connection
+SEARCH_TTL = int(os.environ.get("SYMBOL_SEARCH_TTL", 7 * 24 * 60 * 60))
+SEARCH_LIMIT = 10
+CANDIDATE_LIMIT = 200  # rows read per lookup before ranking
+
+# Lower rank sorts first
+RANK_EXACT, RANK_TICKER_PREFIX, RANK_NAME_PREFIX, RANK_SUBSTRING = range(4)
+# Instruments the user already trades come before ones only seen in search results
+SOURCE_ORDER = {"transaction": 0, "mapping": 1, "yahoo": 2}
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _prefix_bounds(prefix):
+    return prefix, prefix + "\U0010ffff"
+
+
+class SymbolIndex:
+    """Local instrument search over ticker and name.
+
+    Tickers and names are matched by prefix on indexed keys and, from three
+    characters on, by substring through a trigram table, so every
+    autocomplete request is answered from SQLite. ``symbol_search_queries``
+    records which queries were sent to the remote provider, when, and how
+    many results came back, so a query is looked up remotely at most once
+    per ``SEARCH_TTL``.
+    """
+
+    def __init__(self, db_path=DB_PATH, search_ttl=SEARCH_TTL):
+        self.db_path = str(db_path)
+        self.search_ttl = search_ttl
+        self._seeded = None
+
+    def _connection(self):
+        return pooled_connection(self.db_path)
+
+    def add(self, items, source, replace=True):
+        """Index ``{"ticker", "name", "exchange", "type"}`` dicts.
+
+        With ``replace=False`` tickers already indexed keep their entry, so
+        seeding from local data never overwrites a richer search result.
+        """
+        rows = []
+        for item in items:
+            ticker = (item.get("ticker") or "").strip()
+            if not ticker:
+                continue
+            name = (item.get("name") or ticker).strip()
+            rows.append((ticker, name, item.get("exchange") or "", item.get("type") or ""))
+        if not rows:
+            return 0
+
+        conn = self._connection()
+        now = time.time()
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with conn:
+            if not replace:
+                known = set()
+                for chunk in _chunks([row[0] for row in rows], SQL_BATCH_SIZE):
+                    placeholders = ",".join("?" for _ in chunk)
+                    known.update(
+                        row[0]
+                        for row in conn.execute(
+                            f"SELECT ticker FROM instruments WHERE ticker IN ({placeholders})", chunk
+                        )
+                    )
+                rows = [row for row in rows if row[0] not in known]
+            conn.executemany(
+                f"""
+                {verb} INTO instruments (ticker, ticker_key, name, name_key, exchange, type, source, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (ticker, ticker.upper(), name, name.lower(), exchange, kind, source, now)
+                    for ticker, name, exchange, kind in rows
+                ],
+            )
+            conn.executemany(
+                "DELETE FROM instrument_trigrams WHERE ticker = ?", [(row[0],) for row in rows]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO instrument_trigrams (gram, ticker) VALUES (?, ?)",
+                [
+                    (gram, ticker)
+                    for ticker, name, _, _ in rows
+                    for gram in trigrams(ticker) | trigrams(name)
+                ],
+            )
+        return len(rows)
+
+    def seed(self, db, versions):
+        """Index transaction assets and mapped symbols once per ``versions`` change."""
+        if self._seeded == versions:
+            return
+        assets = [
+            {"ticker": row[0]}
+            for row in db.execute(
+                "SELECT DISTINCT TRIM(asset) FROM transactions WHERE TRIM(COALESCE(asset, '')) != ''"
+            )
+        ]
+        self.add(assets, "transaction", replace=False)
+        mappings = [
+            {"ticker": row[0], "name": row[1] or row[0]}
+            for row in db.execute(
+                "SELECT DISTINCT internal_symbol, notes FROM symbol_mappings WHERE active = 1"
+            )
+        ]
+        self.add(mappings, "mapping", replace=False)
+        self._seeded = versions
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        query = (query or "").strip()
+        if not query:
+            return []
+        conn = self._connection()
+        ticker_key, name_key = query.upper(), query.lower()
+
+        candidates = {}
+        for ticker, in conn.execute(
+            """
+            SELECT ticker FROM instruments WHERE ticker_key >= ? AND ticker_key < ?
+            ORDER BY ticker_key LIMIT ?
+            """,
+            (*_prefix_bounds(ticker_key), CANDIDATE_LIMIT),
+        ):
+            candidates[ticker] = None
+        for ticker, in conn.execute(
+            """
+            SELECT ticker FROM instruments WHERE name_key >= ? AND name_key < ?
+            ORDER BY name_key LIMIT ?
+            """,
+            (*_prefix_bounds(name_key), CANDIDATE_LIMIT),
+        ):
+            candidates[ticker] = None
+        grams = sorted(trigrams(query))
+        if grams:
+            placeholders = ",".join("?" for _ in grams)
+            for ticker, in conn.execute(
+                f"""
+                SELECT ticker FROM instrument_trigrams WHERE gram IN ({placeholders})
+                GROUP BY ticker HAVING COUNT(*) = ? LIMIT ?
+                """,
+                [*grams, len(grams), CANDIDATE_LIMIT],
+            ):
+                candidates[ticker] = None
+        if not candidates:
+            return []
+
+        placeholders = ",".join("?" for _ in candidates)
+        scored = []
+        for ticker, key, name, lowered, exchange, kind, source in conn.execute(
+            f"""
+            SELECT ticker, ticker_key, name, name_key, exchange, type, source
+            FROM instruments WHERE ticker IN ({placeholders})
+            """,
+            list(candidates),
+        ):
+            if key == ticker_key:
+                rank = RANK_EXACT
+            elif key.startswith(ticker_key):
+                rank = RANK_TICKER_PREFIX
+            elif lowered.startswith(name_key) or f" {name_key}" in lowered:
+                rank = RANK_NAME_PREFIX
+            elif name_key in lowered or ticker_key in key:
+                rank = RANK_SUBSTRING
+            else:
+                continue  # trigram false positive
+            scored.append(
+                (
+                    (rank, SOURCE_ORDER.get(source, len(SOURCE_ORDER)), len(key), key),
+                    {"ticker": ticker, "name": name, "exchange": exchange, "type": kind},
+                )
+            )
+        scored.sort(key=lambda item: item[0])
+        return [item for _, item in scored[:limit]]
+
+    def needs_remote(self, query, local_results, limit=SEARCH_LIMIT):
+        """True if ``query`` has to be looked up remotely.
+
+        Not when the local answer is already full, when the same query was
+        looked up within the TTL, or when a shorter prefix of it was and came
+        back empty. Yahoo's search is fuzzy and ranked, so a prefix that did
+        return results says nothing about what a longer query would find.
+        """
+        if len(local_results) >= limit:
+            return False
+        query = query.strip().lower()
+        prefixes = [query[:end] for end in range(1, len(query))]
+        fresh_after = time.time() - self.search_ttl
+        conn = self._connection()
+        if conn.execute(
+            "SELECT 1 FROM symbol_search_queries WHERE query = ? AND fetched_at >= ?",
+            (query, fresh_after),
+        ).fetchone():
+            return False
+        for chunk in _chunks(prefixes, SQL_BATCH_SIZE):
+            placeholders = ",".join("?" for _ in chunk)
+            if conn.execute(
+                f"""
+                SELECT 1 FROM symbol_search_queries
+                WHERE query IN ({placeholders}) AND fetched_at >= ? AND results = 0
+                LIMIT 1
+                """,
+                [*chunk, fresh_after],
+            ).fetchone():
+                return False
+        return True
+
+    def record_remote(self, query, items, source):
+        self.add(items, source)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO symbol_search_queries (query, fetched_at, results) VALUES (?, ?, ?)",
+                (query.strip().lower(), time.time(), len(items)),
+            )
+
+
+# Create the global symbol index instance
+SYMBOL_INDEX = SymbolIndex()
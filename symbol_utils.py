@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from typing import List
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
 
 from db import get_db
 
@@ -11,6 +14,58 @@ SYMBOL_TWELVE_OVERRIDES = {
 }
 
 
+VERSION_CHECK_INTERVAL = 2.0  # seconds between checks for changes made by other processes
+
+_mappings_lock = threading.Lock()
+_mappings = {"index": None, "version": None, "checked_at": 0.0}
+
+
+def _mappings_version(db) -> int:
+    row = db.execute("SELECT version FROM data_versions WHERE name = 'symbol_mappings'").fetchone()
+    return row[0] if row else 0
+
+
+def invalidate_symbol_mappings() -> None:
+    """Drop the in-process copy; call after writing to ``symbol_mappings``."""
+    with _mappings_lock:
+        _mappings["index"] = None
+
+
+def _mapping_index(db) -> Dict[Tuple[str, str], List[str]]:
+    """Return ``{(internal_symbol, provider): [provider_symbol, ...]}`` for active aliases.
+
+    The table is loaded once and reused until this process writes to it or
+    the ``symbol_mappings`` data version moves (a write in another process).
+    """
+    now = time.monotonic()
+    with _mappings_lock:
+        index = _mappings["index"]
+        if index is not None and now - _mappings["checked_at"] < VERSION_CHECK_INTERVAL:
+            return index
+
+    version = _mappings_version(db)
+    with _mappings_lock:
+        if _mappings["index"] is not None and _mappings["version"] == version:
+            _mappings["checked_at"] = now
+            return _mappings["index"]
+
+    cur = db.execute(
+        """
+        SELECT internal_symbol, provider, provider_symbol
+        FROM symbol_mappings
+        WHERE active = 1
+        ORDER BY priority ASC, id ASC
+        """
+    )
+    index = defaultdict(list)
+    for internal_symbol, provider, provider_symbol in cur.fetchall():
+        index[(internal_symbol, provider)].append(provider_symbol)
+    index = dict(index)
+    with _mappings_lock:
+        _mappings.update(index=index, version=version, checked_at=now)
+    return index
+
+
 def get_symbol_mappings(asset: str, provider: str) -> List[str]:
     """Return active provider symbols mapped to the internal asset symbol."""
     if not asset:
@@ -18,18 +73,7 @@ def get_symbol_mappings(asset: str, provider: str) -> List[str]:
 
     normalized_asset = asset.strip().upper()
     provider = (provider or "").strip().lower()
-    db = get_db()
-    cur = db.cursor()
-    cur.execute(
-        """
-        SELECT provider_symbol
-        FROM symbol_mappings
-        WHERE internal_symbol = ? AND provider = ? AND active = 1
-        ORDER BY priority ASC, id ASC
-        """,
-        (normalized_asset, provider),
-    )
-    return [row[0] for row in cur.fetchall()]
+    return list(_mapping_index(get_db()).get((normalized_asset, provider), ()))
 
 
 def _base_twelvedata_candidates(asset: str) -> List[str]:
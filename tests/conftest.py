@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import helpers  # noqa: E402
+from price_store import PriceHistoryStore  # noqa: E402
+
+
+@pytest.fixture
+def price_store(tmp_path, monkeypatch):
+    """A PriceHistoryStore on a throwaway database, with Yahoo unreachable."""
+    store = PriceHistoryStore(tmp_path / "portfolio.db")
+    monkeypatch.setattr(helpers, "PRICE_HISTORY", store)
+    monkeypatch.setattr(helpers, "_download_history", lambda symbol, start_date, end_date: None)
+    return store
@@ -0,0 +1,41 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from bond_helpers import BondPosition, _round_cents, accrued_interest_series, calculate_accrual
+
+
+def _bond(principal, rate, capitalization, purchase=date(2024, 1, 1), days=3650):
+    return BondPosition(
+        id=1, series="TEST", bond_type="fixed", purchase_date=purchase,
+        maturity_date=purchase + timedelta(days=days), quantity=1, unit_price=principal,
+        face_value=principal, annual_rate=rate, margin=0.0, index_rate=0.0,
+        capitalization=capitalization, notes=None,
+    )
+
+
+def test_round_cents_matches_round_on_half_cents():
+    half_cents = np.arange(-200000, 200000, 5) / 1000.0
+    ties = np.arange(-800, 800) / 8.0
+    neighbours = np.nextafter(half_cents, np.inf)
+    for values in (half_cents, ties, neighbours):
+        assert _round_cents(values).tolist() == [round(value, 2) for value in values.tolist()]
+
+
+def test_series_matches_calculate_accrual():
+    bonds = [
+        _bond(1000.0, 6.85, True),
+        _bond(100.0, 7.25, False, days=1095),
+        # np.round(..., 2) lands on the wrong side of a half cent on six days
+        _bond(100.0, 7.3, False, days=1095),
+        _bond(5000.0, 5.0, True, purchase=date(2024, 6, 1)),
+    ]
+    days = [date(2023, 12, 1) + timedelta(days=offset) for offset in range(5000)]
+
+    series = accrued_interest_series(bonds, days)
+
+    expected = [
+        sum(calculate_accrual(bond, reference=day)["accrued_interest"] for bond in bonds)
+        for day in days
+    ]
+    assert series.tolist() == expected
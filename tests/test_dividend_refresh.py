@@ -0,0 +1,26 @@
+import pytest
+
+import routes.dividends as dividends
+from cache_store import CacheStore
+
+
+def test_failed_refresh_clears_running_progress(tmp_path, monkeypatch):
+    cache = CacheStore(tmp_path / "portfolio.db")
+    monkeypatch.setattr(dividends, "CACHE", cache)
+    monkeypatch.setattr(dividends, "get_portfolio_assets", lambda: ["AAA"])
+    monkeypatch.setattr(dividends, "build_twelvedata_candidates", lambda asset: [asset])
+    monkeypatch.setattr(dividends, "fetch_dividends_for_asset", lambda asset, candidates: [])
+
+    def upsert_dividends(records):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(dividends, "upsert_dividends", upsert_dividends)
+
+    with pytest.raises(RuntimeError):
+        dividends.refresh_dividends(force=True)
+
+    progress = cache.get("dividends:progress", dividends.DIVIDEND_TTL)
+    assert progress["running"] is False
+    assert progress["error"] == "database is locked"
+    assert progress["done"] == progress["total"] == 1
+    assert not dividends._REFRESH_LOCK.locked()
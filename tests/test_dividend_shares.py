@@ -0,0 +1,30 @@
+import sqlite3
+
+from db import connect, migrate
+from dividend_helpers import reconcile_dividend_shares
+
+
+def _database(tmp_path):
+    db = connect(tmp_path / "portfolio.db")
+    migrate(db)
+    db.row_factory = sqlite3.Row
+    db.executemany(
+        "INSERT INTO transactions (date, asset, type, quantity, price, currency, category) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [
+            ("2026-01-05", "AAA", "buy", 10, 50.0, "USD", "Stock"),
+            ("2026-01-05", "BBB", "buy", 4, 20.0, "USD", "Stock"),
+        ],
+    )
+    db.executemany(
+        "INSERT INTO dividends (asset, ex_date, amount, source) VALUES (?, ?, ?, ?)",
+        [("AAA", "2026-03-01", 0.5, "test"), ("BBB", "2026-03-01", 0.2, "test")],
+    )
+    return db
+
+
+def test_first_scoped_call_reports_the_catch_up_pass(tmp_path):
+    db = _database(tmp_path)
+
+    # No full pass has run yet, so this reconciles every asset, not just AAA
+    assert reconcile_dividend_shares(db, ["AAA"]) == 2
+    assert reconcile_dividend_shares(db, ["AAA"]) == 0
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from helpers import compute_profit_components
+
+SATURDAY = date(2026, 1, 3)
+MONDAY = date(2026, 1, 5)
+LEDGER = [
+    {"id": 1, "date": SATURDAY.isoformat(), "asset": "AAA", "type": "buy",
+     "quantity": 10, "price": 100.0, "currency": "PLN"},
+]
+
+
+def test_read_arrays_matches_read(price_store):
+    series = [(MONDAY + timedelta(days=offset), 100.0 + offset) for offset in range(5)]
+    price_store.append("AAA", series, SATURDAY)
+
+    days, closes = price_store.read_arrays("AAA", MONDAY + timedelta(days=2), date(2026, 2, 1), carry_in=True)
+    expected = price_store.read("AAA", MONDAY + timedelta(days=2), date(2026, 2, 1), carry_in=True)
+
+    assert days.tolist() == [day.toordinal() for day, _ in expected]
+    assert closes.tolist() == [close for _, close in expected]
+
+
+def test_leading_days_inside_synced_range_take_first_close(price_store):
+    price_store.append("AAA", [(MONDAY, 110.0)], SATURDAY)
+
+    components = compute_profit_components(LEDGER, {"AAA": 1.0}, {"AAA": 150.0})
+
+    assert components["start"] == SATURDAY
+    # Saturday and Sunday are valued at Monday's close and count as priced,
+    # where the per-day loop used the current quote (an unrealized 500.0)
+    assert components["unrealized"][:3].tolist() == [100.0, 100.0, 100.0]
+    assert components["priced"][:3].all()
+
+
+def test_leading_days_without_sync_state_use_current_quote(price_store):
+    components = compute_profit_components(LEDGER, {"AAA": 1.0}, {"AAA": 150.0})
+
+    assert np.allclose(components["unrealized"], 500.0)
+    assert not components["priced"].any()
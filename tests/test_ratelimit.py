@@ -0,0 +1,48 @@
+import time
+
+import pytest
+
+import helpers
+import logo_store
+from cache_store import CacheStore
+from services.ratelimit import RateLimited, TokenBucket
+
+
+def test_bounded_acquire_gives_up_behind_debt(tmp_path):
+    bucket = TokenBucket("test", per_minute=8, db_path=tmp_path / "portfolio.db")
+    bucket.acquire(20)  # a dividends call leaves the bucket 12 credits in debt
+
+    started = time.monotonic()
+    with pytest.raises(RateLimited):
+        bucket.acquire(1, max_wait=0.5)
+
+    assert time.monotonic() - started < 0.5
+    assert bucket.usage()["used_today"] == 20
+
+
+@pytest.fixture
+def rate_limited_logos(tmp_path, monkeypatch):
+    cache = CacheStore(tmp_path / "portfolio.db")
+    monkeypatch.setattr(helpers, "CACHE", cache)
+    monkeypatch.setattr(logo_store, "LOGO_DIR", tmp_path / "logos")
+
+    def fetch_logo(symbol, max_wait=None):
+        raise RateLimited("twelvedata rate limit reached")
+
+    monkeypatch.setattr(helpers, "fetch_logo", fetch_logo)
+    monkeypatch.setattr(helpers, "build_twelvedata_candidates", lambda asset: [asset, f"{asset}:XNAS"])
+    return cache
+
+
+def test_rate_limited_logo_falls_back_to_placeholder_uncached(rate_limited_logos):
+    url = helpers.get_logo_urls(["AAA"])["AAA"]
+
+    assert url == logo_store.logo_url(logo_store.placeholder_image("AAA"))
+    assert rate_limited_logos.get("logo:AAA", float("inf")) is None
+
+
+def test_rate_limited_logo_keeps_last_mirrored_file(rate_limited_logos):
+    mirrored = logo_store.store_image(b"<png>", ".png")
+    rate_limited_logos.set("logo:AAA", {"file": mirrored})
+
+    assert helpers.get_logo_urls(["AAA"], max_age=0)["AAA"] == logo_store.logo_url(mirrored)
@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+
+from db import connect, migrate
+from snapshot_helpers import load_profit_series
+
+TODAY = date.today()
+FIRST = TODAY - timedelta(days=20)
+STORED_UNTIL = TODAY - timedelta(days=6)
+LEDGER = [
+    {"id": 1, "date": FIRST.isoformat(), "asset": "AAA", "type": "buy",
+     "quantity": 1, "price": 60.0, "currency": "PLN"},
+]
+
+
+def _closes(start, end, close):
+    return [(start + timedelta(days=offset), close) for offset in range((end - start).days + 1)]
+
+
+def _snapshots(db):
+    return dict(db.execute("SELECT date, unrealized_pln FROM snapshots ORDER BY date"))
+
+
+def test_stale_tail_is_not_snapshotted_until_closes_arrive(tmp_path, price_store):
+    db = connect(tmp_path / "portfolio.db")
+    migrate(db)
+    # The tail download failed: closes stop six days ago and are carried forward
+    price_store.append("AAA", _closes(FIRST, STORED_UNTIL, 100.0), FIRST)
+
+    series = load_profit_series(db, LEDGER, {"AAA": 1.0}, {"AAA": 100.0})
+
+    assert series[-1] == {"date": TODAY.isoformat(), "value": 40.0}
+    stored = _snapshots(db)
+    assert max(stored) == STORED_UNTIL.isoformat()
+    assert set(stored.values()) == {40.0}
+
+    # The next download succeeds with the real, higher closes
+    price_store.append("AAA", _closes(STORED_UNTIL + timedelta(days=1), TODAY, 200.0), FIRST)
+
+    series = load_profit_series(db, LEDGER, {"AAA": 1.0}, {"AAA": 200.0})
+
+    stored = _snapshots(db)
+    assert max(stored) == (TODAY - timedelta(days=1)).isoformat()
+    assert stored[(STORED_UNTIL + timedelta(days=1)).isoformat()] == 140.0
+    assert [point["value"] for point in series[-6:]] == [140.0] * 6